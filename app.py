@@ -1,75 +1,88 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-import openpyxl
-from openpyxl.styles.colors import Color
 from datetime import datetime
-import re
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import coletas
+import desempenho
+import diagnostico
+import exibicao
+import historico
+import medicamentos
+import monitoramento
+import notas
+import riscos
+from parse_cache import ParseCache, content_hash
 
 # ---------------------------------------------------------
-# FUNÇÕES AUXILIARES (Para Análise de Medicamentos)
+# LEITORES DE ARQUIVOS (resultados guardados no cache compartilhado)
 # ---------------------------------------------------------
 
-def get_color_info(cell):
-    """Retorna informações detalhadas sobre a cor da célula para debug."""
-    fill = cell.fill
-    if not fill or not fill.start_color:
-        return "Sem Preenchimento", None
-    
-    color = fill.start_color
-    
-    if color.type == 'rgb':
-        return f"RGB: {color.rgb}", color.rgb
-    if color.type == 'theme':
-        return f"Tema: {color.theme} (Tint: {color.tint})", 'THEME'
-    if color.type == 'indexed':
-        return f"Index: {color.indexed}", 'INDEX'
-        
-    return "Outro", None
-
-def is_green_smart(cell, wb):
-    """Verifica se a célula é verde, tentando lidar com Temas e RGB."""
-    fill = cell.fill
-    if not fill or not fill.start_color:
-        return False
-    
-    color = fill.start_color
-    hex_code = None
-
-    if color.type == 'rgb':
-        hex_code = color.rgb 
-    elif color.type == 'theme':
-        if color.theme in [5, 6, 9]: 
-            return True 
-        return False
-        
-    if hex_code:
-        try:
-            if len(hex_code) > 6:
-                hex_code = hex_code[2:] 
-            if len(hex_code) == 6:
-                r = int(hex_code[0:2], 16)
-                g = int(hex_code[2:4], 16)
-                b = int(hex_code[4:6], 16)
-                return g > r and g > b and g > 60
-        except:
-            pass
-    return False
-
-def parse_date(value):
-    """Extrai data de strings ou objetos datetime."""
-    if isinstance(value, datetime):
-        return value.date()
-    if isinstance(value, str):
-        match = re.search(r'(\d{1,2})/(\d{1,2})/(\d{2,4})', value)
-        if match:
-            try:
-                d, m, y = int(match.group(1)), int(match.group(2)), int(match.group(3))
-                if y < 100: y += 2000
-                return datetime(y, m, d).date()
-            except:
-                pass
-    return None
+@st.cache_resource
+def get_parse_cache():
+    """Instância única do cache, compartilhada entre todas as sessões."""
+    max_mb = int(os.environ.get("PARSE_CACHE_MAX_MB", "512"))
+    return ParseCache(max_bytes=max_mb * 1024 * 1024)
+
+def cached_parse(uploaded_file, parser_name, parser, **options):
+    """Interpreta o upload uma única vez por conteúdo + opções (etapa de leitura no diagnóstico)."""
+    data = uploaded_file.getvalue()
+    diag.add_file(uploaded_file.name, len(data))
+    with diag.stage(f"leitura ({parser_name})"):
+        return get_parse_cache().get_or_parse(data, parser_name, parser, options)
+
+def paginated_dataframe(df, key, ordenar_por=None, decrescente=False, por_pagina=exibicao.LINHAS_POR_PAGINA, **kwargs):
+    """Tabela ordenada e paginada no servidor: só a página visível é enviada ao navegador."""
+    ORDEM_ARQUIVO = "(ordem do arquivo)"
+    opcoes = [ORDEM_ARQUIVO] + list(df.columns)
+    c_coluna, c_ordem, c_pagina = st.columns([2, 1, 1])
+    coluna = c_coluna.selectbox(
+        "Ordenar por:", opcoes, index=opcoes.index(ordenar_por) if ordenar_por in opcoes else 0, key=f"{key}_coluna"
+    )
+    ordem = c_ordem.selectbox("Ordem:", ["Crescente", "Decrescente"], index=int(decrescente), key=f"{key}_ordem")
+    total_paginas = exibicao.page_count(len(df), por_pagina)
+    pagina = c_pagina.number_input("Página", min_value=1, max_value=total_paginas, value=1, key=f"{key}_pagina")
+
+    if coluna == ORDEM_ARQUIVO:
+        ordenado = df if ordem == "Crescente" else df.iloc[::-1]
+        visivel = ordenado.iloc[(pagina - 1) * por_pagina:pagina * por_pagina]
+    else:
+        visivel = exibicao.sorted_page(df, coluna, ordem == "Crescente", pagina, por_pagina)
+    st.dataframe(visivel, use_container_width=True, hide_index=True, **kwargs)
+    st.caption(f"{len(df)} linhas · página {pagina} de {total_paginas}")
+
+@st.cache_resource
+def get_coletas_history():
+    """Histórico acumulado de coletas (arquivo SQLite local), compartilhado entre sessões."""
+    return historico.ColetasHistory()
+
+@st.cache_resource
+def get_controle_watcher(caminho):
+    """Planilha CONTROLE monitorada: lida uma vez e acompanhada em segundo plano, para todas as sessões."""
+    watcher = monitoramento.ControleWatcher(caminho)
+    watcher.refresh()
+    watcher.start()
+    return watcher
+
+def scan_processes():
+    return max(1, int(os.environ.get("MEDICAMENTOS_PROCESSOS", os.cpu_count() or 1)))
+
+@st.cache_resource
+def get_scan_pool():
+    """
+    Pool de processos das planilhas de medicamentos, criado uma vez e
+    reaproveitado (processos já aquecidos). "spawn" porque o servidor do
+    Streamlit tem várias threads e um fork poderia herdar locks presos.
+    """
+    pool = ProcessPoolExecutor(max_workers=scan_processes(), mp_context=multiprocessing.get_context("spawn"))
+    # Sobe os processos já (cada um importa pandas), enquanto o usuário escolhe os arquivos
+    for _ in range(scan_processes()):
+        pool.submit(medicamentos.unit_name, "")
+    return pool
 
 # ---------------------------------------------------------
 # CONFIGURAÇÃO GERAL DA PÁGINA
@@ -94,460 +107,689 @@ pagina_selecionada = st.sidebar.radio(
 )
 st.sidebar.markdown("---")
 
-# =========================================================
-# PÁGINA 1: ANÁLISE DE COLETAS POR COLABORADOR
-# =========================================================
-if pagina_selecionada == "📋 Análise de Coletas":
-    st.header("Análise de Produtividade por Colaborador")
-    st.markdown("Esta ferramenta analisa o arquivo de coletas (CSV) para contabilizar atendimentos.")
+cache_stats = get_parse_cache().stats()
+st.sidebar.caption(
+    f"🗃️ Cache de arquivos: {cache_stats['hits']} acertos / {cache_stats['misses']} leituras · "
+    f"{cache_stats['bytes'] / 1024 / 1024:.1f} de {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB"
+)
+
+# Diagnóstico: tempo por etapa sempre vai para o log; memória alocada só com o painel ligado
+if "diagnostico_sessao" not in st.session_state:
+    st.session_state["diagnostico_sessao"] = uuid.uuid4().hex[:8]
+diagnostico_ativo = st.sidebar.toggle(
+    "🩺 Diagnóstico", key="diagnostico_ativo",
+    help="Mostra o tempo e a memória de cada etapa desta página (deixa a execução um pouco mais lenta)."
+)
+diag = diagnostico.StageTimer(pagina_selecionada, st.session_state["diagnostico_sessao"], memoria=diagnostico_ativo)
 
-    uploaded_file_coletas = st.file_uploader("📂 Carregue o arquivo de Coletas (CSV) aqui", type=["csv"], key="upload_coletas")
+# Mesmo que a página seja interrompida (st.rerun/st.stop são BaseException),
+# o finally encerra a medição e grava o registro da execução
+try:
+    # =========================================================
+    # PÁGINA 1: ANÁLISE DE COLETAS POR COLABORADOR
+    # =========================================================
+    if pagina_selecionada == "📋 Análise de Coletas":
+        st.header("Análise de Produtividade por Colaborador")
+        st.markdown("Esta ferramenta analisa o arquivo de coletas (CSV) para contabilizar atendimentos.")
 
-    if uploaded_file_coletas:
-        try:
+        uploaded_file_coletas = st.file_uploader("📂 Carregue o arquivo de Coletas (CSV) aqui", type=["csv"], key="upload_coletas")
+
+        if uploaded_file_coletas:
             try:
-                df_coletas = pd.read_csv(uploaded_file_coletas, sep=";", encoding='utf-8')
-            except UnicodeDecodeError:
-                uploaded_file_coletas.seek(0)
-                df_coletas = pd.read_csv(uploaded_file_coletas, sep=";", encoding='latin1')
+                dados_coletas = cached_parse(uploaded_file_coletas, "coletas", coletas.prepare_coletas)
             
-            if 'Usuário Nome' in df_coletas.columns and 'O.S.' in df_coletas.columns:
-                resumo = df_coletas.groupby('Usuário Nome')['O.S.'].nunique().reset_index()
-                resumo.columns = ['Colaborador', 'Qtd. Pacientes Atendidos']
-                
-                resumo_grafico = resumo.sort_values(by='Qtd. Pacientes Atendidos', ascending=True)
-                resumo_tabela = resumo.sort_values(by='Qtd. Pacientes Atendidos', ascending=False).reset_index(drop=True)
+                if dados_coletas["resumo"] is not None:
+                    resumo = dados_coletas["resumo"]
                 
-                total_atendimentos = resumo_tabela['Qtd. Pacientes Atendidos'].sum()
-                df_total = pd.DataFrame([['TOTAL', total_atendimentos]], columns=['Colaborador', 'Qtd. Pacientes Atendidos'])
-                resumo_tabela = pd.concat([resumo_tabela, df_total], ignore_index=True)
-
-                st.subheader("Resumo de Atendimentos")
-                col1, col2 = st.columns([1, 2])
+                    lista_colaboradores = resumo.sort_values(
+                        by='Qtd. Pacientes Atendidos', ascending=False, kind='stable'
+                    )['Colaborador'].unique()
+                    total_atendimentos = int(resumo['Qtd. Pacientes Atendidos'].sum())
+
+                    st.subheader("Resumo de Atendimentos")
+                    st.write(f"**TOTAL: {total_atendimentos} pacientes atendidos por {len(resumo)} colaboradores.**")
+                    col1, col2 = st.columns([1, 2])
                 
-                with col1:
-                    st.write("**Tabela de Dados:**")
-                    st.dataframe(
-                        resumo_tabela,
-                        use_container_width=True,
-                        hide_index=True,
-                        height=500,
-                        column_config={
-                            "Qtd. Pacientes Atendidos": st.column_config.NumberColumn(
-                                "Qtd. Pacientes",
-                                help="Número total de pacientes únicos atendidos",
-                                format="%d"
+                    with col1:
+                        st.write("**Tabela de Dados:**")
+                        with diag.stage("tabela resumo"):
+                            paginated_dataframe(
+                                resumo,
+                                key="coletas_resumo",
+                                ordenar_por='Qtd. Pacientes Atendidos',
+                                decrescente=True,
+                                column_config={
+                                    "Qtd. Pacientes Atendidos": st.column_config.NumberColumn(
+                                        "Qtd. Pacientes",
+                                        help="Número total de pacientes únicos atendidos",
+                                        format="%d"
+                                    )
+                                }
                             )
-                        }
-                    )
                     
-                with col2:
-                    st.write("**Gráfico Visual:**")
-                    fig = px.bar(
-                        resumo_grafico, 
-                        x='Qtd. Pacientes Atendidos', 
-                        y='Colaborador', 
-                        orientation='h', 
-                        text_auto=True,
-                        title="Pacientes Atendidos por Colaborador"
-                    )
-                    
-                    fig.update_layout(
-                        xaxis_title="Quantidade de Pacientes",
-                        yaxis_title="Colaborador",
-                        showlegend=False,
-                        height=500,
-                        margin=dict(r=50)
-                    )
-                    fig.update_traces(textposition='outside', cliponaxis=False)
-                    st.plotly_chart(fig, use_container_width=True)
+                    with col2:
+                        st.write("**Gráfico Visual:**")
+                        if len(resumo):
+                            qtd_grafico = st.number_input(
+                                "Colaboradores no gráfico (os demais são somados em 'Outros'):",
+                                min_value=1,
+                                max_value=len(resumo),
+                                value=min(20, len(resumo)),
+                                key="coletas_top_n"
+                            )
+                            with diag.stage("gráfico resumo"):
+                                # Só os N primeiros + "Outros"; acima do limite de barras o gráfico usa WebGL
+                                resumo_grafico = exibicao.top_n_with_others(
+                                    resumo, 'Colaborador', 'Qtd. Pacientes Atendidos', qtd_grafico
+                                )
+                                fig = exibicao.ranking_figure(
+                                    resumo_grafico, 'Colaborador', 'Qtd. Pacientes Atendidos',
+                                    "Pacientes Atendidos por Colaborador"
+                                )
+                                fig.update_layout(
+                                    xaxis_title="Quantidade de Pacientes",
+                                    yaxis_title="Colaborador"
+                                )
+                                st.plotly_chart(fig, use_container_width=True)
+                        else:
+                            st.info("Nenhum colaborador com O.S. no arquivo.")
 
-                st.markdown("---")
+                    st.markdown("---")
 
-                st.subheader("🔎 Detalhes por Colaborador")
-                st.info("Selecione um colaborador abaixo para ver a lista detalhada.")
+                    st.subheader("🔎 Detalhes por Colaborador")
+                    st.info("Selecione um colaborador abaixo para ver a lista detalhada.")
 
-                lista_colaboradores = resumo_tabela[resumo_tabela['Colaborador'] != 'TOTAL']['Colaborador'].unique()
-                colaborador_selecionado = st.selectbox("Escolha o Colaborador:", lista_colaboradores)
+                    colaborador_selecionado = st.selectbox("Escolha o Colaborador:", lista_colaboradores)
 
-                if colaborador_selecionado:
-                    df_filtrado = df_coletas[df_coletas['Usuário Nome'] == colaborador_selecionado].copy()
-                    
-                    colunas_detalhe = ['Data da Operação', 'O.S.', 'Paciente', 'Paciente Nome', 'Detalhe Descrição']
-                    cols_existentes = [c for c in colunas_detalhe if c in df_filtrado.columns]
-                    df_detalhe_final = df_filtrado[cols_existentes]
-                    
-                    df_detalhe_unico = df_detalhe_final.drop_duplicates(subset=['O.S.'])
+                    if colaborador_selecionado:
+                        # Fatia direta pelo índice pré-calculado (sem varrer o arquivo)
+                        with diag.stage("detalhe do colaborador"):
+                            df_detalhe_unico = coletas.collaborator_detail(dados_coletas, colaborador_selecionado)
 
-                    st.write(f"**Pacientes atendidos por: {colaborador_selecionado}**")
-                    st.dataframe(
-                        df_detalhe_unico, 
-                        use_container_width=True,
-                        hide_index=True
-                    )
+                            st.write(f"**Pacientes atendidos por: {colaborador_selecionado}**")
+                            # Ordenação e paginação no servidor: só a página visível vai para o navegador
+                            paginated_dataframe(df_detalhe_unico, key="coletas_detalhe")
                     
-                    csv = df_detalhe_unico.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label="📥 Baixar detalhes (CSV)",
-                        data=csv,
-                        file_name=f'detalhes_{colaborador_selecionado}.csv',
-                        mime='text/csv',
-                    )
-            else:
-                st.error("O arquivo carregado não possui as colunas 'Usuário Nome' ou 'O.S.'. Verifique se o arquivo está correto.")
+                        # CSV gerado só quando o botão é clicado
+                        st.download_button(
+                            label="📥 Baixar detalhes (CSV)",
+                            data=lambda: df_detalhe_unico.to_csv(index=False).encode('utf-8'),
+                            file_name=f'detalhes_{colaborador_selecionado}.csv',
+                            mime='text/csv',
+                        )
+
+                    st.markdown("---")
+
+                    # --- SÉRIE TEMPORAL (Data da Operação) ---
+                    st.subheader("⏱️ Produtividade ao Longo do Tempo")
+                    if dados_coletas["atendimentos"] is None:
+                        st.write("O arquivo não possui a coluna 'Data da Operação'.")
+                    elif st.toggle("Mostrar pacientes por hora, turno e dia", key="coletas_tempo_ativo"):
+                        granularidade = st.radio(
+                            "Agrupar por:", list(coletas.GRANULARIDADES), horizontal=True, key="coletas_tempo_granularidade"
+                        )
+                        colaboradores_serie = st.multiselect(
+                            "Colaboradores na série:",
+                            list(lista_colaboradores),
+                            default=list(lista_colaboradores[:5]),
+                            key="coletas_tempo_colaboradores",
+                        )
+                        with diag.stage("série temporal"):
+                            serie = coletas.productivity_series(dados_coletas, granularidade, colaboradores_serie)
+                            if not serie.empty:
+                                # Traços WebGL quando a série é grande: o navegador continua leve com meses de dados por hora
+                                fig_serie = px.line(
+                                    serie,
+                                    x='Período',
+                                    y='Pacientes',
+                                    color='Colaborador',
+                                    render_mode=exibicao.render_mode(len(serie)),
+                                    title=f"Pacientes por {granularidade.lower()} e colaborador"
+                                )
+                                st.plotly_chart(fig_serie, use_container_width=True)
+
+                            col_hora, col_turno = st.columns([2, 1])
+                            with col_hora:
+                                fig_horas = px.imshow(
+                                    coletas.hour_of_day_profile(dados_coletas),
+                                    aspect="auto",
+                                    color_continuous_scale="Blues",
+                                    labels=dict(x="Hora do dia", y="Colaborador", color="Pacientes/dia"),
+                                    title="Média diária de pacientes por hora do dia"
+                                )
+                                st.plotly_chart(fig_horas, use_container_width=True)
+                            with col_turno:
+                                st.write("**Média diária por turno:**")
+                                st.dataframe(coletas.shift_profile(dados_coletas).style.format("{:.1f}"), use_container_width=True)
+
+                            fig_calendario = px.imshow(
+                                coletas.team_calendar(dados_coletas),
+                                aspect="auto",
+                                color_continuous_scale="Blues",
+                                labels=dict(x="Hora do dia", y="Dia", color="Pacientes"),
+                                title="Pacientes da equipe por dia e hora"
+                            )
+                            st.plotly_chart(fig_calendario, use_container_width=True)
+
+                    st.markdown("---")
+
+                    # --- HISTÓRICO ACUMULADO ---
+                    st.subheader("🗂️ Histórico Acumulado")
+                    historico_coletas = get_coletas_history()
+
+                    # Cada arquivo é somado ao histórico uma única vez (por conteúdo)
+                    with diag.stage("histórico (gravação)"):
+                        if st.session_state.get("coletas_historico_arquivo") != uploaded_file_coletas.file_id:
+                            st.session_state["coletas_historico_carga"] = historico_coletas.append(
+                                dados_coletas["df"],
+                                content_hash(uploaded_file_coletas.getvalue()),
+                                arquivo=uploaded_file_coletas.name,
+                                momentos=dados_coletas["momentos"],
+                            )
+                            st.session_state["coletas_historico_arquivo"] = uploaded_file_coletas.file_id
+                    carga = st.session_state["coletas_historico_carga"]
+                    if carga["ja_carregado"]:
+                        st.caption("Este arquivo já fazia parte do histórico.")
+                    else:
+                        st.caption(f"{carga['novas']} O.S. novas adicionadas ao histórico.")
 
-        except Exception as e:
-            st.error(f"Ocorreu um erro ao processar o arquivo de coletas: {e}")
-    else:
-        st.info("Por favor, carregue o arquivo CSV de coletas para visualizar os dados.")
+                    inicio_hist, fim_hist = historico_coletas.date_bounds()
+                    if inicio_hist is None:
+                        st.write("O histórico ainda não tem coletas com data.")
+                    else:
+                        periodo = st.date_input(
+                            "Período:",
+                            value=(inicio_hist, fim_hist),
+                            min_value=inicio_hist,
+                            max_value=fim_hist,
+                            format="DD/MM/YYYY",
+                            key="coletas_historico_periodo",
+                        )
+                        if isinstance(periodo, (tuple, list)) and len(periodo) == 2:
+                            # Soma dos parciais diários (não relê as coletas)
+                            with diag.stage("histórico (consulta)"):
+                                resumo_periodo = historico_coletas.summary(periodo[0], periodo[1])
+                                resumo_periodo = resumo_periodo.sort_values(
+                                    by='Qtd. Pacientes Atendidos', ascending=False
+                                ).reset_index(drop=True)
+                                st.write(
+                                    f"**{int(resumo_periodo['Qtd. Pacientes Atendidos'].sum())} pacientes atendidos "
+                                    f"de {periodo[0].strftime('%d/%m/%Y')} a {periodo[1].strftime('%d/%m/%Y')}.**"
+                                )
+                                st.dataframe(resumo_periodo, use_container_width=True, hide_index=True)
+                        else:
+                            st.info("Selecione a data inicial e a final do período.")
 
-# =========================================================
-# PÁGINA 2: MAPEAMENTO DE RISCOS
-# =========================================================
-elif pagina_selecionada == "⚠️ Mapeamento de Riscos":
-    st.header("Análise de Riscos Institucionais - Alta e Muito Alta Gravidade")
-    st.markdown("""
-    Esta ferramenta analisa o arquivo de Mapeamento de Riscos (Excel ou CSV) e filtra eventos classificados como **Alto** ou **Muito Alto**.
-    Códigos considerados: `2A`, `3A`, `4A`, `5A`, `3B`, `4B`, `5B`, `5C`.
-    """)
+                    with st.expander("Arquivos no histórico"):
+                        st.dataframe(historico_coletas.loads(), use_container_width=True, hide_index=True)
+                else:
+                    st.error("O arquivo carregado não possui as colunas 'Usuário Nome' ou 'O.S.'. Verifique se o arquivo está correto.")
 
-    uploaded_file_riscos = st.file_uploader("📂 Carregue seu arquivo Excel ou CSV de Riscos aqui", type=["xlsx", "csv"], key="upload_riscos")
+            except Exception as e:
+                st.error(f"Ocorreu um erro ao processar o arquivo de coletas: {e}")
+        else:
+            st.info("Por favor, carregue o arquivo CSV de coletas para visualizar os dados.")
 
-    if uploaded_file_riscos:
-        try:
-            is_csv = uploaded_file_riscos.name.lower().endswith('.csv')
+    # =========================================================
+    # PÁGINA 2: MAPEAMENTO DE RISCOS
+    # =========================================================
+    elif pagina_selecionada == "⚠️ Mapeamento de Riscos":
+        st.header("Análise de Riscos Institucionais - Alta e Muito Alta Gravidade")
+        st.markdown("""
+        Esta ferramenta analisa o arquivo de Mapeamento de Riscos (Excel ou CSV) e filtra eventos classificados como **Alto** ou **Muito Alto**.
+        Códigos considerados: `2A`, `3A`, `4A`, `5A`, `3B`, `4B`, `5B`, `5C`.
+        """)
+
+        uploaded_file_riscos = st.file_uploader("📂 Carregue seu arquivo Excel ou CSV de Riscos aqui", type=["xlsx", "csv"], key="upload_riscos")
+
+        if uploaded_file_riscos:
+            try:
+                is_csv = uploaded_file_riscos.name.lower().endswith('.csv')
             
-            if is_csv:
-                sheet_names = ["Arquivo CSV"]
-            else:
-                xl = pd.ExcelFile(uploaded_file_riscos)
-                sheet_names = [s for s in xl.sheet_names if "Legenda" not in s]
+                if is_csv:
+                    sheet_names = [riscos.NOME_ABA_CSV]
+                else:
+                    # Arquivo aberto uma única vez; abas lidas sob demanda
+                    sessao_riscos = cached_parse(uploaded_file_riscos, "riscos_sessao", riscos.RiskWorkbookSession)
+                    sheet_names = sessao_riscos.sheet_names
             
-            st.sidebar.header("Filtros (Riscos)")
-            selected_sheet = st.sidebar.selectbox("Selecione o Setor (Aba):", sheet_names)
+                TODOS_SETORES = "📚 Todos os setores"
+                ANO_INTEIRO = "Ano inteiro"
+
+                st.sidebar.header("Filtros (Riscos)")
+                selected_sheet = st.sidebar.selectbox("Selecione o Setor (Aba):", sheet_names + [TODOS_SETORES])
             
-            months = ['JAN', 'FEV', 'MAR', 'ABR', 'MAI', 'JUN', 'JUL', 'AGO', 'SET', 'OUT', 'NOV', 'DEZ']
-            selected_month = st.sidebar.selectbox("Selecione o Mês:", months)
+                selected_month = st.sidebar.selectbox("Selecione o Mês:", riscos.MESES + [ANO_INTEIRO])
             
-            if st.sidebar.button("🔍 Buscar Riscos", key="btn_buscar_riscos"):
-                
-                if is_csv:
-                    uploaded_file_riscos.seek(0) 
-                    df_riscos = pd.read_csv(uploaded_file_riscos, header=None, sep=';', encoding='latin1')
-                else:
-                    df_riscos = pd.read_excel(uploaded_file_riscos, sheet_name=selected_sheet, header=None)
-                
-                target_risks = ['2A', '3A', '4A', '5A', '3B', '4B', '5B', '5C']
+                if st.sidebar.button("🔍 Buscar Riscos", key="btn_buscar_riscos"):
                 
-                month_idx = months.index(selected_month)
-                content_col_index = 8 + (month_idx * 2)
-                risk_col_index = content_col_index + 1
-                
-                results = []
+                    setor = None if selected_sheet == TODOS_SETORES else selected_sheet
+
+                    # Matriz de riscos (todos os meses) da aba escolhida, ou de todas
+                    if is_csv:
+                        matriz = cached_parse(uploaded_file_riscos, "riscos_matriz_csv", riscos.build_risk_matrix_csv)
+                    else:
+                        with diag.stage("matriz de riscos"):
+                            matriz = sessao_riscos.matrix(None if setor is None else [setor])
+                            # Enquanto o usuário olha esta aba, as demais são lidas em segundo plano
+                            sessao_riscos.prefetch()
                 
-                for index, row in df_riscos.iterrows():
-                    first_col = str(row[0])
-                    if pd.isna(row[0]) or first_col.strip() in [
-                        'FONTE', 'IDENTIFICAÇÃO DO RISCO', 'Identificação do Risco', 
-                        'Riscos Institucionais Gerenciados', 
-                        'Riscos Institucionais  não Gerenciados/Inventariados', 
-                        'C.H.O.R.C.'
-                    ]:
-                        continue
-                    
-                    if len(row) > risk_col_index:
-                        risk_value = str(row[risk_col_index]).strip().upper()
-                        
-                        if risk_value in target_risks:
-                            results.append({
-                                "Identificação do Risco": row[0],
-                                "Causa": row[1],
-                                f"Conteúdo ({selected_month})": row[content_col_index],
-                                "Classificação": risk_value
-                            })
+                    mes = None if selected_month == ANO_INTEIRO else selected_month
+                    with diag.stage("consulta"):
+                        encontrados = riscos.lookup(matriz, setor, mes)
                 
-                if results:
-                    st.success(f"Foram encontrados {len(results)} riscos com gravidade Alta/Muito Alta em {selected_sheet} no mês de {selected_month}.")
-                    df_results = pd.DataFrame(results)
-                    st.dataframe(df_results, use_container_width=True, hide_index=True)
-                else:
-                    st.info(f"Nenhum risco alto ou muito alto encontrado em {selected_sheet} para {selected_month}.")
+                    if not encontrados.empty:
+                        st.success(f"Foram encontrados {len(encontrados)} riscos com gravidade Alta/Muito Alta em {selected_sheet} no mês de {selected_month}.")
+                        if setor is not None and mes is not None:
+                            df_results = encontrados[['Identificação do Risco', 'Causa', 'Conteúdo', 'Classificação']].rename(
+                                columns={'Conteúdo': f"Conteúdo ({selected_month})"}
+                            )
+                        else:
+                            # Visão consolidada: mantém setor e mês para identificar a origem
+                            df_results = encontrados.drop(columns=['Linha'] + (['Setor'] if setor else []) + (['Mês'] if mes else []))
+                        with diag.stage("tabela de riscos"):
+                            st.dataframe(df_results, use_container_width=True, hide_index=True)
+                    else:
+                        st.info(f"Nenhum risco alto ou muito alto encontrado em {selected_sheet} para {selected_month}.")
                     
-        except Exception as e:
-            st.error(f"Erro ao processar o arquivo: {e}")
-    else:
-        st.info("Por favor, carregue o arquivo Excel ou CSV na área acima para começar a análise de riscos.")
+            except Exception as e:
+                st.error(f"Erro ao processar o arquivo: {e}")
+        else:
+            st.info("Por favor, carregue o arquivo Excel ou CSV na área acima para começar a análise de riscos.")
 
-# =========================================================
-# PÁGINA 3: ANÁLISE DE MEDICAMENTOS
-# =========================================================
-elif pagina_selecionada == "💊 Análise de Medicamentos":
-    st.header("Análise de Atrasos - Medicamentos")
-    st.markdown("Verifica células da **Coluna G** (pintadas de verde) e compara com a data de hoje para identificar atrasos na retirada.")
+    # =========================================================
+    # PÁGINA 3: ANÁLISE DE MEDICAMENTOS
+    # =========================================================
+    elif pagina_selecionada == "💊 Análise de Medicamentos":
+        st.header("Análise de Atrasos - Medicamentos")
+        st.markdown("Verifica células da **Coluna G** (pintadas de verde) e compara com a data de hoje para identificar atrasos na retirada.")
 
-    uploaded_file_med = st.file_uploader("📂 Carregue a planilha (.xlsx)", type=["xlsx"], key="upload_med")
+        caminho_controle = os.environ.get("MEDICAMENTOS_CONTROLE_ARQUIVO")
+        origem_med = st.radio(
+            "Origem da planilha:", ["📂 Carregar arquivo", "👁️ Planilha monitorada", "🏥 Várias unidades"],
+            horizontal=True, key="med_origem"
+        )
 
-    if uploaded_file_med:
         try:
-            wb = openpyxl.load_workbook(uploaded_file_med, data_only=True)
-            if 'CONTROLE' in wb.sheetnames:
-                ws = wb['CONTROLE']
-            else:
-                ws = wb.active
-                
+            extrato = None
             hoje = datetime.now().date()
-            st.info(f"📅 **Data de Hoje:** {hoje.strftime('%d/%m/%Y')} | Aba analisada: {ws.title}")
-            
-            atrasados = []
-            debug_data = [] 
-            
-            for i, row in enumerate(ws.iter_rows(min_row=8, min_col=1, max_col=10), start=8):
-                cell_date = row[6] 
-                cell_name = row[1] 
-                cell_med = row[3]  
-                
-                val_date = cell_date.value
-                parsed_date = parse_date(val_date)
-                
-                e_verde = is_green_smart(cell_date, wb)
-                
-                color_desc, _ = get_color_info(cell_date)
-                debug_data.append({
-                    "Linha Excel": i,
-                    "Paciente": cell_name.value,
-                    "Conteúdo Coluna G": str(val_date),
-                    "Data Entendida": parsed_date.strftime('%d/%m/%Y') if parsed_date else "Não detectada",
-                    "Cor Detectada": color_desc,
-                    "É Verde?": "SIM" if e_verde else "NÃO"
-                })
-                
-                if e_verde and parsed_date:
-                    if parsed_date < hoje:
-                        atrasados.append({
-                            "Linha": i,
-                            "Nome do Paciente": cell_name.value,
-                            "Medicamento": cell_med.value,
-                            "Data Prevista": parsed_date.strftime('%d/%m/%Y'),
-                            "Dias de Atraso": (hoje - parsed_date).days
-                        })
-
-            if atrasados:
-                st.error(f"🚨 **{len(atrasados)} MEDICAMENTOS ATRASADOS ENCONTRADOS!**")
-                df_atrasados = pd.DataFrame(atrasados)
-                
-                try:
-                    st.dataframe(df_atrasados.style.background_gradient(cmap="Reds", subset=["Dias de Atraso"]), use_container_width=True)
-                except:
-                    st.warning("A biblioteca 'matplotlib' não foi encontrada. Exibindo tabela sem gradiente de cores.")
-                    st.dataframe(df_atrasados, use_container_width=True)
-                
-                csv_atraso = df_atrasados.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    "📥 Baixar Relatório de Atrasados (CSV)",
-                    data=csv_atraso,
-                    file_name="medicamentos_atrasados.csv",
-                    mime="text/csv"
+
+            if origem_med == "📂 Carregar arquivo":
+                uploaded_file_med = st.file_uploader("📂 Carregue a planilha (.xlsx)", type=["xlsx"], key="upload_med")
+                if uploaded_file_med:
+                    extrato = cached_parse(uploaded_file_med, "medicamentos_controle", medicamentos.read_controle)
+                    with diag.stage("atrasos"):
+                        df_atrasados = medicamentos.overdue(extrato['linhas'], hoje)
+            elif origem_med == "🏥 Várias unidades":
+                pool_unidades = get_scan_pool()
+                arquivos_unidades = st.file_uploader(
+                    "📂 Carregue as planilhas das unidades (.xlsx)", type=["xlsx", "xlsm"],
+                    accept_multiple_files=True, key="upload_med_unidades"
                 )
+                pasta_unidades = st.text_input("Ou caminho de uma pasta no servidor:", key="pasta_med_unidades")
+
+                entradas = []
+                versoes = []
+                for arquivo in arquivos_unidades or []:
+                    diag.add_file(arquivo.name, arquivo.size)
+                    entradas.append((medicamentos.unit_name(arquivo.name), arquivo.getvalue()))
+                    versoes.append(arquivo.file_id)
+                if pasta_unidades:
+                    # Da pasta só vão os caminhos: cada processo lê o seu arquivo
+                    for unidade, caminho in medicamentos.list_controle_files(pasta_unidades):
+                        entradas.append((unidade, caminho))
+                        info = os.stat(caminho)
+                        diag.add_file(caminho, info.st_size)
+                        versoes.append((caminho, info.st_mtime_ns, info.st_size))
+                entradas = medicamentos.unique_units(entradas)
+
+                if entradas:
+                    # O lote roda uma vez por conjunto de arquivos e dia; os reruns só redesenham
+                    chave_lote = (tuple(versoes), hoje)
+                    lote = st.session_state.get("med_unidades_lote")
+                    progresso = st.empty()
+                    resumo_ph = st.empty()
+                    tabela_ph = st.empty()
+                    st.markdown("#### ⏱️ Tempo por planilha")
+                    tempos_ph = st.empty()
+
+                    if lote is None or lote["chave"] != chave_lote:
+                        registros = []
+                        inicio = time.perf_counter()
+                        barra = progresso.progress(0.0, text=f"0 de {len(entradas)} planilhas")
+                        with diag.stage(f"unidades ({len(entradas)} planilhas)"):
+                            for registro in medicamentos.scan_units(entradas, hoje, pool=pool_unidades):
+                                registros.append(registro)
+                                barra.progress(len(registros) / len(entradas),
+                                               text=f"{len(registros)} de {len(entradas)} planilhas · {registro['unidade']} pronta")
+                                tabela_ph.dataframe(medicamentos.consolidate_overdue(registros), use_container_width=True, hide_index=True)
+                                tempos_ph.dataframe(medicamentos.timing_table(registros), use_container_width=True, hide_index=True)
+                        if any(r.get("pool_quebrado") for r in registros):
+                            # Um processo morreu: descarta o pool compartilhado para a próxima análise criar outro
+                            pool_unidades.shutdown(wait=False, cancel_futures=True)
+                            get_scan_pool.clear()
+                        lote = {"chave": chave_lote, "registros": registros, "segundos": time.perf_counter() - inicio}
+                        st.session_state["med_unidades_lote"] = lote
+                    progresso.empty()
+
+                    registros = lote["registros"]
+                    consolidado = medicamentos.consolidate_overdue(registros)
+                    tempos = medicamentos.timing_table(registros)
+                    falhas = tempos[tempos["Status"] != "ok"]
+                    if consolidado.empty:
+                        resumo_ph.success(f"✅ Nenhum atraso detectado nas {len(registros) - len(falhas)} planilhas lidas.")
+                    else:
+                        resumo_ph.error(
+                            f"🚨 **{len(consolidado)} MEDICAMENTOS ATRASADOS** em "
+                            f"{consolidado['Unidade'].nunique()} de {len(registros)} unidades."
+                        )
+                    tabela_ph.dataframe(consolidado, use_container_width=True, hide_index=True)
+                    tempos_ph.dataframe(tempos, use_container_width=True, hide_index=True)
+                    st.caption(
+                        f"Tempo total: {lote['segundos']:.2f}s · maior planilha: {tempos['Total no processo (s)'].max():.2f}s · "
+                        f"soma das planilhas: {tempos['Total no processo (s)'].sum():.2f}s · "
+                        f"{scan_processes()} processos"
+                    )
+                    for _, falha in falhas.iterrows():
+                        st.warning(f"⚠️ {falha['Unidade']}: {falha['Erro']}")
+                    if not consolidado.empty:
+                        st.download_button(
+                            "📥 Baixar Relatório Consolidado (CSV)",
+                            data=consolidado.to_csv(index=False).encode('utf-8'),
+                            file_name="medicamentos_atrasados_unidades.csv",
+                            mime="text/csv"
+                        )
+            elif not caminho_controle:
+                st.info("Nenhuma planilha monitorada configurada. Defina a variável de ambiente MEDICAMENTOS_CONTROLE_ARQUIVO com o caminho do arquivo na pasta compartilhada.")
             else:
-                st.success("✅ Nenhum atraso detectado nas células verdes.")
-                st.warning("⚠️ Se você vê uma célula verde atrasada e ela não apareceu, verifique o 'Modo Raio-X' abaixo.")
+                # A releitura acontece em segundo plano; aqui só se lê o que já está pronto em memória
+                watcher = get_controle_watcher(caminho_controle)
+                if st.button("🔄 Verificar alterações agora", key="med_verificar"):
+                    with diag.stage("monitoramento (releitura)"):
+                        watcher.refresh()
+                estado = watcher.status()
+                if estado["erro"]:
+                    st.warning(f"Não foi possível reler a planilha monitorada ({estado['erro']}). Exibindo a última versão lida.")
+                extrato = watcher.extrato
+                if extrato is not None:
+                    with diag.stage("atrasos"):
+                        df_atrasados = watcher.overdue(hoje)
+                    mudanca = estado["ultima_mudanca"]
+                    st.caption(
+                        f"👁️ {estado['caminho']} · atualizado em {estado['atualizado_em']:%d/%m/%Y %H:%M:%S} "
+                        f"({mudanca['reavaliadas']} linhas reavaliadas, {mudanca['removidas']} removidas, "
+                        f"{mudanca['segundos']:.2f}s) · verificado em {estado['verificado_em']:%H:%M:%S}"
+                    )
+
+            if extrato is not None:
+                st.info(f"📅 **Data de Hoje:** {hoje.strftime('%d/%m/%Y')} | Aba analisada: {extrato['titulo_aba']}")
 
-            with st.expander("🔍 MODO RAIO-X (Debug de cores)"):
-                st.write("Veja abaixo como o programa leu cada linha. Útil para verificar se a cor verde foi detectada corretamente.")
-                df_debug = pd.DataFrame(debug_data)
-                st.dataframe(df_debug)
+                if not df_atrasados.empty:
+                    st.error(f"🚨 **{len(df_atrasados)} MEDICAMENTOS ATRASADOS ENCONTRADOS!**")
+                
+                    with diag.stage("tabela de atrasos"):
+                        try:
+                            st.dataframe(df_atrasados.style.background_gradient(cmap="Reds", subset=["Dias de Atraso"]), use_container_width=True)
+                        except:
+                            st.warning("A biblioteca 'matplotlib' não foi encontrada. Exibindo tabela sem gradiente de cores.")
+                            st.dataframe(df_atrasados, use_container_width=True)
+                
+                    csv_atraso = df_atrasados.to_csv(index=False).encode('utf-8')
+                    st.download_button(
+                        "📥 Baixar Relatório de Atrasados (CSV)",
+                        data=csv_atraso,
+                        file_name="medicamentos_atrasados.csv",
+                        mime="text/csv"
+                    )
+                else:
+                    st.success("✅ Nenhum atraso detectado nas células verdes.")
+                    st.warning("⚠️ Se você vê uma célula verde atrasada e ela não apareceu, verifique o 'Modo Raio-X' abaixo.")
+
+                with st.expander("🔍 MODO RAIO-X (Debug de cores)"):
+                    st.write("Veja abaixo como o programa leu cada linha. Útil para verificar se a cor verde foi detectada corretamente.")
+                    # Nada é montado até o usuário pedir; depois, só a página visível
+                    if st.toggle("Carregar leitura linha a linha", key="raio_x_ativo"):
+                        filtro_raio_x = st.selectbox("Mostrar:", list(medicamentos.FILTROS_RAIO_X), key="raio_x_filtro")
+                        with diag.stage("raio-x"):
+                            posicoes = medicamentos.xray_filter(extrato, filtro_raio_x)
+                            total_paginas = exibicao.page_count(len(posicoes), medicamentos.LINHAS_POR_PAGINA_RAIO_X)
+                            pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key="raio_x_pagina")
+                            st.caption(f"{len(posicoes)} linhas · página {pagina} de {total_paginas}")
+                            st.dataframe(medicamentos.xray_page(extrato, posicoes, pagina), hide_index=True)
 
         except Exception as e:
             st.error(f"Erro crítico ao processar o arquivo de medicamentos: {e}")
 
-# =========================================================
-# PÁGINA 4: ORGANIZADOR DE NOTAS
-# =========================================================
-elif pagina_selecionada == "📂 Organizador de Notas":
-    st.header("Organizador de Notas e Arquivos")
-    
-    uploaded_files_notas = st.file_uploader(
-        "Solte as notas em pdf aqui", 
-        accept_multiple_files=True, 
-        type=['pdf'],
-        key="upload_notas"
-    )
-
-    if uploaded_files_notas:
-        agrupamento = {}
-        total_processados = 0
-        arquivos_nao_lidos = []
-
-        barra_progresso = st.progress(0)
-        
-        for i, arquivo in enumerate(uploaded_files_notas):
-            nome_arquivo = arquivo.name
-            
-            # --- LÓGICA DE DETECÇÃO FLEXÍVEL ---
-            numero = None
-            nome = None
-            
-            # Padrões Regex
-            match1 = re.search(r"^C\s+(\d+)\s*[-]\s*(.+)\.pdf", nome_arquivo, re.IGNORECASE)
-            match2 = re.search(r"^(.+?)\s*[-]\s*(\d+)", nome_arquivo, re.IGNORECASE)
-
-            if match1:
-                numero = match1.group(1)
-                nome = match1.group(2).upper().strip()
-            elif match2:
-                nome = match2.group(1).upper().strip()
-                numero = match2.group(2)
-            
-            if nome and numero:
-                if nome not in agrupamento:
-                    agrupamento[nome] = []
-                agrupamento[nome].append(numero)
-                total_processados += 1
+    # =========================================================
+    # PÁGINA 4: ORGANIZADOR DE NOTAS
+    # =========================================================
+    elif pagina_selecionada == "📂 Organizador de Notas":
+        st.header("Organizador de Notas e Arquivos")
+
+        modo_entrada = st.radio(
+            "Origem das notas:",
+            ["Arquivos PDF", "Arquivo ZIP", "Pasta no servidor"],
+            horizontal=True,
+            key="modo_notas"
+        )
+
+        # Só os nomes dos arquivos são usados na detecção; a origem serve para a exportação
+        itens_notas = []
+        abrir_nota = None
+        try:
+            if modo_entrada == "Arquivos PDF":
+                uploaded_files_notas = st.file_uploader(
+                    "Solte as notas em pdf aqui", 
+                    accept_multiple_files=True, 
+                    type=['pdf'],
+                    key="upload_notas"
+                )
+                itens_notas = [(arquivo.name, arquivo) for arquivo in uploaded_files_notas or []]
+                abrir_nota = notas.open_upload
+            elif modo_entrada == "Arquivo ZIP":
+                uploaded_zip_notas = st.file_uploader("Solte um .zip com as notas em pdf", type=['zip'], key="upload_zip_notas")
+                if uploaded_zip_notas:
+                    # Lê apenas o diretório central do ZIP; os PDFs não são descompactados
+                    with diag.stage("listagem do ZIP"):
+                        itens_notas = notas.list_zip_entries(uploaded_zip_notas)
+                        abrir_nota = notas.ZipEntryOpener(uploaded_zip_notas)
             else:
-                arquivos_nao_lidos.append(nome_arquivo)
-            
-            barra_progresso.progress((i + 1) / len(uploaded_files_notas))
-
-        barra_progresso.empty()
-
-        st.success(f"Processamento concluído! {total_processados} arquivos identificados.")
+                pasta_notas = st.text_input("Caminho da pasta no servidor:", key="pasta_notas")
+                if pasta_notas:
+                    with diag.stage("listagem da pasta"):
+                        itens_notas = notas.list_folder_entries(pasta_notas)
+                        abrir_nota = notas.open_path
+        except Exception as e:
+            st.error(f"Não foi possível ler as notas: {e}")
+
+        if itens_notas:
+            barra_progresso = st.progress(0)
+
+            # Padrões pré-compilados; a barra é atualizada no máximo algumas vezes por segundo
+            with diag.stage("classificação"):
+                classificador = notas.NoteClassifier(notas.load_patterns())
+                resultado_notas = classificador.run(itens_notas, progresso=barra_progresso.progress)
+                agrupamento = resultado_notas["agrupamento"]
+                arquivos_nao_lidos = resultado_notas["nao_lidos"]
+                classificados = resultado_notas["classificados"]
+                total_processados = resultado_notas["total_processados"]
+
+            barra_progresso.empty()
+
+            st.success(f"Processamento concluído! {total_processados} arquivos identificados.")
+            st.caption(
+                f"⏱️ {len(itens_notas)} arquivos em {resultado_notas['segundos']:.2f} s "
+                f"({resultado_notas['arquivos_por_segundo']:,.0f} arquivos/s)"
+            )
         
-        if arquivos_nao_lidos:
-            with st.expander(f"⚠️ {len(arquivos_nao_lidos)} arquivos não foram reconhecidos (Ver lista)"):
-                st.write("Estes arquivos não seguiram nem o padrão 'C Num - Nome' nem 'Nome - Num':")
-                for arq in arquivos_nao_lidos:
-                    st.write(f"- {arq}")
-
-        st.write("---")
-
-        if agrupamento:
-            col1, col2 = st.columns([1, 2])
+            if arquivos_nao_lidos:
+                with st.expander(f"⚠️ {len(arquivos_nao_lidos)} arquivos não foram reconhecidos (Ver lista)"):
+                    nomes_padroes = " / ".join(f"'{nome}'" for nome, _ in classificador.padroes)
+                    st.write(f"Estes arquivos não seguiram nenhum dos padrões {nomes_padroes}:")
+                    for arq in arquivos_nao_lidos:
+                        st.write(f"- {arq}")
+
+            st.write("---")
+
+            with diag.stage("resumo por empresa"):
+                if agrupamento:
+                    col1, col2 = st.columns([1, 2])
             
-            with col1:
-                st.subheader("Resumo")
-                for empresa, lista in agrupamento.items():
-                    st.write(f"**{empresa}**: {len(lista)} arquivos")
-
-            with col2:
-                st.subheader("Detalhes (Números)")
-                for empresa, lista_numeros in agrupamento.items():
-                    with st.expander(f"Ver números da {empresa} ({len(lista_numeros)})"):
-                        texto_copia = ", ".join(lista_numeros)
-                        st.code(texto_copia, language="text")
-
-        else:
-            st.warning("Nenhum arquivo compatível foi encontrado.")
+                    with col1:
+                        st.subheader("Resumo")
+                        for empresa, lista in agrupamento.items():
+                            st.write(f"**{empresa}**: {len(lista)} arquivos")
+
+                    with col2:
+                        st.subheader("Detalhes (Números)")
+                        for empresa, lista_numeros in agrupamento.items():
+                            with st.expander(f"Ver números da {empresa} ({len(lista_numeros)})"):
+                                texto_copia = ", ".join(lista_numeros)
+                                st.code(texto_copia, language="text")
 
-# =========================================================
-# PÁGINA 5: ANÁLISE DE DESEMPENHO (NOVA)
-# =========================================================
-elif pagina_selecionada == "📊 Análise de Desempenho":
-    st.header("Painel de Análise de Desempenho")
-    st.markdown("Faça o upload do arquivo (Excel ou CSV) para visualizar as médias e observações por colaborador.")
-
-    # Upload do arquivo (aceita CSV e Excel)
-    uploaded_file_desempenho = st.file_uploader("Carregue o arquivo aqui", type=["csv", "xlsx"], key="upload_desempenho")
-
-    if uploaded_file_desempenho is not None:
-        try:
-            # Verifica a extensão para usar o leitor correto
-            if uploaded_file_desempenho.name.endswith('.csv'):
-                df_desempenho = pd.read_csv(uploaded_file_desempenho)
-            else:
-                df_desempenho = pd.read_excel(uploaded_file_desempenho)
-            
-            # Dicionário para armazenar a estrutura dos dados
-            collaborators_data = {}
-            current_collaborator = None
-            
-            # Mapeamento dinâmico das colunas
-            for col in df_desempenho.columns:
-                # 1. Identificar início de novo colaborador
-                if "Você tem contato suficiente com o(a) colaborador(a)" in col:
-                    match = re.search(r"colaborador\(a\) (.+?) para", col)
-                    if match:
-                        current_collaborator = match.group(1)
-                        collaborators_data[current_collaborator] = {
-                            'coluna_contato': col,
-                            'colunas_notas': [],
-                            'coluna_obs': None
-                        }
-                
-                # 2. Identificar coluna de Observações
-                elif current_collaborator and str(col).strip().startswith("Observações:"):
-                    collaborators_data[current_collaborator]['coluna_obs'] = col
-                    current_collaborator = None # Fecha o ciclo deste colaborador
-                
-                # 3. Identificar coluna de Notas
-                elif current_collaborator:
-                    collaborators_data[current_collaborator]['colunas_notas'].append(col)
+                else:
+                    st.warning("Nenhum arquivo compatível foi encontrado.")
+
+            st.write("---")
+            st.subheader("📦 Exportar notas organizadas")
+            st.write("Gera um único .zip com uma pasta por empresa, uma pasta para os não reconhecidos e um manifesto CSV.")
+            # O ZIP só é montado quando o botão é clicado (em disco, sem recomprimir os PDFs)
+            st.download_button(
+                "📥 Baixar ZIP organizado por empresa",
+                data=lambda: notas.export_company_zip(classificados, abrir_nota),
+                file_name="notas_organizadas.zip",
+                mime="application/zip",
+            )
+
+    # =========================================================
+    # PÁGINA 5: ANÁLISE DE DESEMPENHO (NOVA)
+    # =========================================================
+    elif pagina_selecionada == "📊 Análise de Desempenho":
+        st.header("Painel de Análise de Desempenho")
+        st.markdown("Faça o upload do arquivo (Excel ou CSV) para visualizar as médias e observações por colaborador.")
+
+        # Upload do arquivo (aceita CSV e Excel)
+        uploaded_file_desempenho = st.file_uploader("Carregue o arquivo aqui", type=["csv", "xlsx"], key="upload_desempenho")
+
+        if uploaded_file_desempenho is not None:
+            try:
+                # Cubo com todas as notas e médias, montado uma vez por arquivo
+                cubo = cached_parse(
+                    uploaded_file_desempenho, "desempenho", desempenho.prepare_survey,
+                    is_csv=uploaded_file_desempenho.name.endswith('.csv')
+                )
+                collaborators_data = cubo["mapa"]
 
-            # Seletor de Colaborador
-            collab_list = list(collaborators_data.keys())
+                # Seletor de Colaborador
+                collab_list = list(collaborators_data.keys())
             
-            if collab_list:
-                selected_collab = st.selectbox("👤 Selecione o Colaborador:", collab_list)
-                
-                # Dados do colaborador selecionado
-                data_info = collaborators_data[selected_collab]
-                col_contato = data_info['coluna_contato']
-                cols_notas = data_info['colunas_notas']
-                col_obs = data_info['coluna_obs']
+                if collab_list:
+                    selected_collab = st.selectbox("👤 Selecione o Colaborador:", collab_list)
                 
-                # Filtrar apenas quem respondeu "Sim"
-                df_filtered = df_desempenho[df_desempenho[col_contato].astype(str).str.contains(r"^Sim", case=False, na=False)]
+                    # Dados do colaborador selecionado
+                    col_obs = collaborators_data[selected_collab]['coluna_obs']
                 
-                qtd_avaliadores = len(df_filtered)
+                    # Apenas quem respondeu "Sim" (já calculado no cubo)
+                    qtd_avaliadores = int(cubo["avaliadores"][selected_collab])
                 
-                # Exibir métrica de avaliadores
-                st.metric(label="👥 Pessoas que avaliaram este colaborador", value=qtd_avaliadores)
+                    # Exibir métrica de avaliadores
+                    st.metric(label="👥 Pessoas que avaliaram este colaborador", value=qtd_avaliadores)
                 
-                if qtd_avaliadores > 0:
-                    st.divider()
+                    if qtd_avaliadores > 0:
+                        st.divider()
 
-                    # --- CÁLCULO DAS MÉDIAS ---
-                    st.subheader("📈 Médias de Desempenho (0 a 100)")
+                        # --- MÉDIAS (já agregadas) ---
+                        st.subheader("📈 Médias de Desempenho (0 a 100)")
                     
-                    medias = {}
-                    for col in cols_notas:
-                        # Limpeza do nome da coluna
-                        clean_name = re.sub(r'\s+\d+$', '', col).strip() 
-                        clean_name = re.sub(r'^\d+\.\s*', '', clean_name)
-
-                        # Conversão e média
-                        numeric_series = pd.to_numeric(df_filtered[col], errors='coerce')
-                        media_val = numeric_series.mean()
-                        medias[clean_name] = media_val
-
-                    # DataFrame para exibição
-                    df_medias = pd.DataFrame(list(medias.items()), columns=['Critério', 'Média'])
-                    df_medias = df_medias.set_index('Critério')
+                        with diag.stage("médias"):
+                            df_medias = desempenho.collaborator_means(cubo, selected_collab)
                     
-                    # Exibir tabela
-                    st.dataframe(df_medias.style.format("{:.2f}"), use_container_width=True)
+                            # Exibir tabela
+                            st.dataframe(df_medias.style.format("{:.2f}"), use_container_width=True)
 
-                    st.divider()
+                        st.divider()
 
-                    # --- OBSERVAÇÕES ---
-                    st.subheader("📝 Observações")
+                        # --- OBSERVAÇÕES ---
+                        st.subheader("📝 Observações")
                     
-                    if col_obs:
-                        observacoes = df_filtered[col_obs].dropna()
+                        with diag.stage("observações"):
+                            if col_obs:
+                                observacoes = desempenho.collaborator_observations(cubo, selected_collab)
                         
-                        if not observacoes.empty:
-                            for i, obs in enumerate(observacoes):
-                                with st.container():
-                                    st.info(f"**Observação {i+1}:** {obs}")
-                        else:
-                            st.write("Nenhuma observação registrada para este colaborador.")
-                    else:
-                        st.warning("Coluna de observações não encontrada para este colaborador.")
+                                if not observacoes.empty:
+                                    # Filtro e paginação no servidor: só a página visível vai para a tela
+                                    termo_obs = st.text_input("🔎 Filtrar observações por palavra:", key="obs_filtro")
+                                    filtradas = desempenho.filter_observations(observacoes, termo_obs)
+                                    total_paginas = exibicao.page_count(len(filtradas), desempenho.OBSERVACOES_POR_PAGINA)
+                                    pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key="obs_pagina")
+                                    st.caption(f"{len(filtradas)} de {len(observacoes)} observações · página {pagina} de {total_paginas}")
+                                    for numero, obs in desempenho.observations_page(filtradas, pagina).items():
+                                        st.info(f"**Observação {numero}:** {obs}")
+                                else:
+                                    st.write("Nenhuma observação registrada para este colaborador.")
+                            else:
+                                st.warning("Coluna de observações não encontrada para este colaborador.")
 
-                else:
-                    st.warning("Nenhum avaliador respondeu que tem contato suficiente com este colaborador.")
+                    else:
+                        st.warning("Nenhum avaliador respondeu que tem contato suficiente com este colaborador.")
             
-            else:
-                st.error("Não foi possível identificar colaboradores automaticamente. Verifique as colunas do arquivo.")
+                    st.divider()
+                    with st.expander("🏆 Visão geral: todos os colaboradores"):
+                        with diag.stage("visão geral"):
+                            st.write("**Ranking pela média geral dos critérios:**")
+                            st.dataframe(
+                                desempenho.ranking(cubo).style.format({"Média Geral": "{:.2f}"}),
+                                use_container_width=True,
+                                hide_index=True
+                            )
+                            matriz_medias = desempenho.heatmap_matrix(cubo)
+                            if not matriz_medias.empty:
+                                fig_calor = px.imshow(
+                                    matriz_medias,
+                                    text_auto=".0f",
+                                    aspect="auto",
+                                    color_continuous_scale="RdYlGn",
+                                    zmin=0,
+                                    zmax=100,
+                                    title="Média por Critério e Colaborador"
+                                )
+                                st.plotly_chart(fig_calor, use_container_width=True)
+                        st.download_button(
+                            "📥 Exportar todas as observações (CSV)",
+                            data=lambda: desempenho.export_observations_csv(cubo),
+                            file_name="observacoes_desempenho.csv",
+                            mime="text/csv",
+                        )
+            
+                else:
+                    st.error("Não foi possível identificar colaboradores automaticamente. Verifique as colunas do arquivo.")
 
-        except Exception as e:
-            st.error(f"Erro ao processar o arquivo: {e}")
+            except Exception as e:
+                st.error(f"Erro ao processar o arquivo: {e}")
+
+finally:
+    registro_diagnostico = diag.finish()
+    try:
+        diagnostico.log_run(registro_diagnostico)
+    except OSError:
+        pass  # sem permissão de escrita no log: o painel continua funcionando
+
+# =========================================================
+# PAINEL DE DIAGNÓSTICO
+# =========================================================
+if diagnostico_ativo:
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=True):
+        rss_pico = registro_diagnostico["rss_pico_mb"]
+        st.caption(
+            f"Execução: {registro_diagnostico['total_segundos']:.2f} s"
+            + (f" · pico RSS do processo: {rss_pico:.0f} MB" if rss_pico is not None else "")
+        )
+        st.dataframe(diag.table().style.format(precision=2), hide_index=True, use_container_width=True)
+        mais_lentas = diagnostico.slowest_stages(10)
+        if not mais_lentas.empty:
+            st.write("**Etapas mais lentas registradas:**")
+            st.dataframe(
+                mais_lentas[["quando", "pagina", "etapa", "arquivos", "segundos"]],
+                hide_index=True,
+                use_container_width=True,
+            )
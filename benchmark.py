@@ -0,0 +1,472 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Color, PatternFill
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import coletas
+import desempenho
+import diagnostico
+import exibicao
+import medicamentos
+import notas
+import riscos
+from tabelas import HAS_PYARROW, to_columnar
+
+# ---------------------------------------------------------
+# BENCHMARK COM DADOS SINTÉTICOS
+# ---------------------------------------------------------
+# Gera entradas grandes no formato real de cada página e mede, por página,
+# as etapas de leitura (parse), cálculo (compute) e preparação do que vai
+# para a tela (render-prep: tabelas e figuras serializadas). O tempo é o
+# melhor de N repetições; o pico de memória vem de uma passada extra com
+# tracemalloc. Os resultados podem ser gravados como baseline e comparados
+# nas execuções seguintes.
+#
+#   python benchmark.py [--escala 1.0] [--paginas coletas riscos ...] [--salvar-baseline]
+#
+# A baseline depende da máquina: grave e compare sempre no mesmo servidor.
+
+ARQUIVO_BASELINE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+TOLERANCIA_PADRAO = 0.25    # 25% mais lento que a baseline = regressão
+FOLGA_MINIMA = 0.05         # segundos; diferenças menores são ruído
+
+TAMANHOS = {
+    "coletas": 1_000_000,     # linhas do CSV
+    "riscos": 30,             # abas de setor
+    "medicamentos": 50_000,   # linhas da aba CONTROLE
+    "notas": 10_000,          # nomes de arquivo
+    "desempenho": 500,        # respondentes
+}
+
+_NOMES = ['JOSÉ', 'JOÃO', 'MARIA', 'ANA', 'CONCEIÇÃO', 'ANTÔNIO', 'FÁTIMA', 'SEBASTIÃO', 'LÚCIA', 'ANDRÉ']
+_SOBRENOMES = ['SILVA', 'SOUZA', 'ARAÚJO', 'GONÇALVES', 'ASSUNÇÃO', 'MONTEIRO']
+_EXAMES = ['Hemograma', 'Glicose', 'TSH', 'Creatinina', 'Ureia', 'Coagulação', 'Urina tipo I', 'Lipídios']
+_EMPRESAS = ['ACME LTDA', 'BETA SERVIÇOS', 'GAMA LOGÍSTICA', 'DELTA COMÉRCIO', 'ÔMEGA SAÚDE']
+_CRITERIOS = ['Pontualidade', 'Cordialidade', 'Organização', 'Trabalho em equipe', 'Comunicação', 'Iniciativa']
+
+
+# ---------------------------------------------------------
+# GERADORES
+# ---------------------------------------------------------
+
+def generate_coletas_csv(caminho, linhas, seed=0):
+    """
+    CSV de coletas separado por ';' em latin1, com colunas extras como no
+    export real e algumas células vazias (O.S., Paciente, Usuário Nome).
+    """
+    rng = np.random.default_rng(seed)
+    colaboradores = np.array([f"{n} {s}" for n in _NOMES for s in _SOBRENOMES])
+    minutos = pd.date_range("2026-01-01", periods=60 * 24 * 30, freq="min").strftime("%d/%m/%Y %H:%M")
+    os_ = rng.integers(1, max(2, linhas // 3), linhas)   # ~3 exames por O.S.
+    df = pd.DataFrame({
+        "Data da Operação": np.asarray(minutos)[np.sort(rng.integers(0, len(minutos), linhas))],
+        "O.S.": os_,
+        "Paciente": os_ * 7 % 1_000_003,
+        "Paciente Nome": np.char.add("Paciente ", (os_ % 50_000).astype(str)),
+        "Detalhe Descrição": np.asarray(_EXAMES)[rng.integers(0, len(_EXAMES), linhas)],
+        "Usuário Nome": colaboradores[rng.integers(0, len(colaboradores), linhas)],
+        "Unidade": "Unidade Central",
+        "Setor": "Coleta",
+        "Convênio": np.asarray(["SUS", "Particular", "Plano"])[rng.integers(0, 3, linhas)],
+        "Observação": "",
+    })
+    # ~0,1% de células vazias, como nos exports reais (inteiros com vazio continuam sem ".0")
+    for coluna in ("O.S.", "Paciente", "Usuário Nome"):
+        vazias = rng.random(linhas) < 0.001
+        if coluna != "Usuário Nome":
+            df[coluna] = df[coluna].astype("Int64")
+        df.loc[vazias, coluna] = None
+    df.to_csv(caminho, sep=";", index=False, encoding="latin1")
+
+
+def generate_risk_workbook(caminho, abas, linhas_por_aba=150, seed=0):
+    """Planilha de riscos: colunas A/B + 6 de apoio e, a partir de I, conteúdo e classificação por mês."""
+    rng = np.random.default_rng(seed)
+    codigos = np.asarray(riscos.RISCOS_ALTOS + ['1A', '1B', '2B', '1C', '2C', '3C', '4C', '1D', ''])
+    wb = Workbook(write_only=True)
+    for n in range(abas):
+        ws = wb.create_sheet(f"Setor {n + 1:02d}")
+        ws.append(['Riscos Institucionais Gerenciados'])
+        ws.append(['IDENTIFICAÇÃO DO RISCO', 'Causa'] + [None] * 6
+                  + [v for mes in riscos.MESES for v in (mes, None)])
+        classes = codigos[rng.integers(0, len(codigos), (linhas_por_aba, len(riscos.MESES)))]
+        for i in range(linhas_por_aba):
+            meses = []
+            for m, classe in enumerate(classes[i]):
+                meses += [f"Controle {i}-{m}", classe or None]
+            ws.append([f"Risco {n}.{i}", f"Causa {i}"] + [None] * 6 + meses)
+    wb.create_sheet("Legenda").append(["Código", "Gravidade"])
+    wb.save(caminho)
+
+
+def generate_controle_workbook(caminho, linhas, seed=0):
+    """
+    Aba CONTROLE a partir da linha 8, com a coluna G misturando datas, textos
+    e preenchimentos RGB, de tema (com tint) e indexados.
+    """
+    rng = np.random.default_rng(seed)
+    preenchimentos = [
+        PatternFill("solid", fgColor="FF00B050"),                       # RGB verde
+        PatternFill("solid", fgColor="FF92D050"),                       # RGB verde claro
+        PatternFill("solid", fgColor="FFFFFF00"),                       # RGB amarelo
+        PatternFill("solid", fgColor=Color(theme=9, tint=0.3999)),      # tema
+        PatternFill("solid", fgColor=Color(theme=6, tint=-0.2499)),     # tema
+        PatternFill("solid", fgColor=Color(indexed=11)),                # indexada verde
+        PatternFill("solid", fgColor=Color(indexed=10)),                # indexada vermelha
+        None,
+    ]
+    inicio = datetime(2025, 1, 1)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(medicamentos.ABA_CONTROLE)
+    for _ in range(medicamentos.LINHA_INICIAL - 1):
+        ws.append(["CONTROLE DE MEDICAMENTOS"])
+    tipos = rng.integers(0, 4, linhas)
+    dias = rng.integers(0, 600, linhas)
+    cores = rng.integers(0, len(preenchimentos), linhas)
+    for i in range(linhas):
+        data = inicio + timedelta(days=int(dias[i]))
+        valor = [data, data.strftime("%d/%m/%y"), f"retirar {data:%d/%m/%Y}", None][tipos[i]]
+        celula = WriteOnlyCell(ws, value=valor)
+        if preenchimentos[cores[i]] is not None:
+            celula.fill = preenchimentos[cores[i]]
+        ws.append([None, f"Paciente {i}", None, f"Medicamento {i % 40}", None, None, celula])
+    wb.save(caminho)
+
+
+def generate_note_names(quantidade, seed=0):
+    """Nomes de notas nos dois padrões ('C Num - Empresa' e 'Empresa - Num') e alguns fora do padrão."""
+    rng = np.random.default_rng(seed)
+    nomes = []
+    for i in range(quantidade):
+        empresa = _EMPRESAS[rng.integers(0, len(_EMPRESAS))]
+        sorteio = rng.random()
+        if sorteio < 0.45:
+            nomes.append(f"C {1000 + i} - {empresa}.pdf")
+        elif sorteio < 0.9:
+            nomes.append(f"{empresa} - {5000 + i}.pdf")
+        else:
+            nomes.append(f"digitalizacao_{i:05d}.pdf")
+    return nomes
+
+
+def generate_notes_zip(caminho, quantidade, seed=0):
+    with zipfile.ZipFile(caminho, "w", zipfile.ZIP_STORED) as zf:
+        for nome in generate_note_names(quantidade, seed):
+            zf.writestr(f"notas/{nome}", b"%PDF-1.4\n%%EOF\n")
+
+
+def generate_survey_workbook(caminho, respondentes, colaboradores=25, seed=0):
+    """Pesquisa de desempenho no layout do Forms: um bloco de colunas por colaborador."""
+    rng = np.random.default_rng(seed)
+    colunas = {"Carimbo de data/hora": pd.date_range("2026-03-01", periods=respondentes, freq="17min")}
+    for b in range(colaboradores):
+        nome = f"Colaborador {b + 1:02d}"
+        sufixo = f" {b + 1}" if b else ""   # o Forms numera as perguntas repetidas
+        colunas[f"{desempenho.TEXTO_CONTATO} {nome} para avaliá-lo(a)?"] = (
+            np.asarray(["Sim", "Sim, bastante", "Não"])[rng.integers(0, 3, respondentes)]
+        )
+        for k, criterio in enumerate(_CRITERIOS, start=1):
+            colunas[f"{k}. {criterio}{sufixo}"] = rng.integers(0, 101, respondentes)
+        obs = np.asarray(["", "Bom trabalho.", "Precisa melhorar a comunicação.", "Muito atencioso(a)."])
+        colunas[f"Observações: {nome}"] = obs[rng.integers(0, len(obs), respondentes)]
+    pd.DataFrame(colunas).replace("", None).to_excel(caminho, index=False)
+
+
+GERADORES = {
+    "coletas": ("coletas.csv", generate_coletas_csv),
+    "riscos": ("riscos.xlsx", generate_risk_workbook),
+    "medicamentos": ("controle.xlsx", generate_controle_workbook),
+    "notas": ("notas.zip", generate_notes_zip),
+    "desempenho": ("desempenho.xlsx", generate_survey_workbook),
+}
+
+
+def ensure_inputs(pasta, paginas, escala=1.0):
+    """Gera (ou reaproveita) os arquivos sintéticos de cada página na escala pedida."""
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = {}
+    for pagina in paginas:
+        nome, gerador = GERADORES[pagina]
+        tamanho = max(1, int(TAMANHOS[pagina] * escala))
+        caminho = os.path.join(pasta, f"{tamanho}_{nome}")
+        if not os.path.exists(caminho):
+            inicio = time.perf_counter()
+            gerador(caminho, tamanho)
+            print(f"  gerado {os.path.basename(caminho)} em {time.perf_counter() - inicio:.1f}s", flush=True)
+        caminhos[pagina] = caminho
+    return caminhos
+
+
+# ---------------------------------------------------------
+# ETAPAS DE CADA PÁGINA
+# ---------------------------------------------------------
+# Cada função devolve [(etapa, função sem argumentos)]; as etapas guardam o
+# que produzem em `ctx` para a seguinte.
+
+def _serialize(df):
+    """O que o st.dataframe faz com a tabela antes de enviá-la ao navegador."""
+    if HAS_PYARROW:
+        import pyarrow as pa
+        return pa.Table.from_pandas(to_columnar(df))
+    return df.to_csv()
+
+
+def _read_bytes(caminho):
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def coletas_stages(caminho):
+    data = _read_bytes(caminho)
+    ctx = {}
+
+    def parse():
+        ctx["df"] = coletas.load_coletas_csv(data)
+
+    def compute():
+        ctx["preparado"] = coletas.build_coletas(ctx["df"])
+
+    def render_prep():
+        preparado = ctx["preparado"]
+        resumo = preparado["resumo"]
+        _serialize(exibicao.sorted_page(resumo, 'Qtd. Pacientes Atendidos', False))
+        grafico = exibicao.top_n_with_others(resumo, 'Colaborador', 'Qtd. Pacientes Atendidos', 20)
+        exibicao.ranking_figure(grafico, 'Colaborador', 'Qtd. Pacientes Atendidos', "").to_json()
+        primeiro = grafico['Colaborador'].iloc[0]
+        _serialize(exibicao.sorted_page(coletas.collaborator_detail(preparado, primeiro), 'O.S.'))
+        serie = coletas.productivity_series(preparado, "Hora")
+        px.line(serie, x='Período', y='Pacientes', color='Colaborador',
+                render_mode=exibicao.render_mode(len(serie))).to_json()
+        px.imshow(coletas.hour_of_day_profile(preparado), aspect="auto").to_json()
+        px.imshow(coletas.team_calendar(preparado), aspect="auto").to_json()
+
+    return [("parse", parse), ("compute", compute), ("render-prep", render_prep)]
+
+
+def riscos_stages(caminho):
+    data = _read_bytes(caminho)
+    ctx = {}
+
+    def parse():
+        # Como a página: abre a planilha uma vez e lê cada aba pela sessão (que a grava em disco)
+        sessao = riscos.RiskWorkbookSession(data)
+        for nome in sessao.sheet_names:
+            sessao.sheet(nome)
+        ctx["sessao"] = sessao
+
+    def compute():
+        # "Todos os setores": o que sessao.matrix() faz, sem a memorização (que esconderia as repetições)
+        sessao = ctx["sessao"]
+        partes = [riscos.extract_high_risks(sessao.sheet(nome), nome) for nome in sessao.sheet_names]
+        ctx["matriz"] = pd.concat(partes, ignore_index=True)
+
+    def render_prep():
+        matriz = ctx["matriz"]
+        setor = matriz['Setor'].iloc[0]
+        for mes in riscos.MESES:
+            _serialize(riscos.lookup(matriz, setor, mes).drop(columns=['Setor', 'Mês', 'Linha']))
+        _serialize(riscos.lookup(matriz).drop(columns=['Linha']))
+
+    return [("parse", parse), ("compute", compute), ("render-prep", render_prep)]
+
+
+def medicamentos_stages(caminho):
+    data = _read_bytes(caminho)
+    ctx = {}
+    hoje = datetime(2026, 10, 1).date()
+
+    def parse():
+        ctx["extrato"] = medicamentos.read_controle(data)
+
+    def compute():
+        ctx["atrasados"] = medicamentos.overdue(ctx["extrato"]['linhas'], hoje)
+        ctx["filtros"] = {f: medicamentos.xray_filter(ctx["extrato"], f) for f in medicamentos.FILTROS_RAIO_X}
+
+    def render_prep():
+        _serialize(ctx["atrasados"])
+        ctx["atrasados"].to_csv(index=False).encode('utf-8')
+        for posicoes in ctx["filtros"].values():
+            _serialize(medicamentos.xray_page(ctx["extrato"], posicoes, 1))
+
+    return [("parse", parse), ("compute", compute), ("render-prep", render_prep)]
+
+
+def notas_stages(caminho):
+    ctx = {}
+
+    def parse():
+        ctx["itens"] = notas.list_zip_entries(caminho)
+
+    def compute():
+        ctx["resultado"] = notas.NoteClassifier(notas.load_patterns()).run(ctx["itens"])
+
+    def render_prep():
+        # Os textos que a página escreve: resumo e números por empresa, lista de não reconhecidos
+        agrupamento = ctx["resultado"]["agrupamento"]
+        ctx["textos"] = (
+            [f"**{empresa}**: {len(numeros)} arquivos" for empresa, numeros in agrupamento.items()]
+            + [", ".join(numeros) for numeros in agrupamento.values()]
+            + [f"- {arq}" for arq in ctx["resultado"]["nao_lidos"]]
+        )
+
+    def export():
+        dados = notas.export_company_zip(ctx["resultado"]["classificados"], notas.ZipEntryOpener(caminho))
+        # O mesmo caminho que o download_button percorre com o retorno do callable
+        convert_data_to_bytes_and_infer_mime(dados, TypeError(f"download_button não aceita {type(dados).__name__}"))
+
+    return [("parse", parse), ("compute", compute), ("render-prep", render_prep), ("export", export)]
+
+
+def desempenho_stages(caminho):
+    data = _read_bytes(caminho)
+    ctx = {}
+
+    def parse():
+        ctx["df"] = desempenho.read_survey(data, is_csv=False)
+
+    def compute():
+        ctx["cubo"] = desempenho.build_survey_cube(ctx["df"])
+
+    def render_prep():
+        cubo = ctx["cubo"]
+        for nome in cubo["mapa"]:
+            _serialize(desempenho.collaborator_means(cubo, nome).reset_index())
+            desempenho.observations_page(desempenho.collaborator_observations(cubo, nome), 1)
+        _serialize(desempenho.ranking(cubo))
+        px.imshow(desempenho.heatmap_matrix(cubo), aspect="auto").to_json()
+
+    return [("parse", parse), ("compute", compute), ("render-prep", render_prep)]
+
+
+PAGINAS = {
+    "coletas": coletas_stages,
+    "riscos": riscos_stages,
+    "medicamentos": medicamentos_stages,
+    "notas": notas_stages,
+    "desempenho": desempenho_stages,
+}
+
+
+# ---------------------------------------------------------
+# MEDIÇÃO, BASELINE E COMPARAÇÃO
+# ---------------------------------------------------------
+
+def measure(etapa, repeticoes=1, memoria=True):
+    """Melhor tempo de `repeticoes` execuções e, opcionalmente, o pico do tracemalloc (MB)."""
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        etapa()
+        tempos.append(time.perf_counter() - inicio)
+    pico = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            etapa()
+            pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    return {"segundos": min(tempos), "pico_mb": pico}
+
+
+def run_benchmarks(caminhos, repeticoes=1, memoria=True):
+    resultados = {}
+    for pagina, caminho in caminhos.items():
+        resultados[pagina] = {}
+        for etapa, funcao in PAGINAS[pagina](caminho):
+            medida = measure(funcao, repeticoes, memoria)
+            resultados[pagina][etapa] = medida
+            pico = "" if medida["pico_mb"] is None else f"  pico {medida['pico_mb']:8.1f} MB"
+            print(f"  {pagina:<13}{etapa:<12}{medida['segundos']:8.3f}s{pico}", flush=True)
+    return resultados
+
+
+def compare(resultados, baseline, tolerancia=TOLERANCIA_PADRAO):
+    """Etapas mais lentas que a baseline além da tolerância: lista de (página, etapa, antes, agora)."""
+    regressoes = []
+    for pagina, etapas in resultados.items():
+        for etapa, medida in etapas.items():
+            anterior = baseline.get("resultados", {}).get(pagina, {}).get(etapa)
+            if not anterior:
+                continue
+            antes, agora = anterior["segundos"], medida["segundos"]
+            if agora > antes * (1 + tolerancia) and agora - antes > FOLGA_MINIMA:
+                regressoes.append((pagina, etapa, antes, agora))
+    return regressoes
+
+
+def _metadata(escala):
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "escala": escala,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "maquina": platform.node(),
+        "pyarrow": HAS_PYARROW,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das páginas do dashboard com dados sintéticos.")
+    parser.add_argument("--paginas", nargs="+", choices=list(PAGINAS), default=list(PAGINAS))
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help="fração do tamanho padrão dos dados (ex.: 0.1 para um teste rápido)")
+    parser.add_argument("--dados", default=os.path.join(tempfile.gettempdir(), "dashboard_benchmark"),
+                        help="pasta dos arquivos sintéticos (reaproveitados entre execuções)")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico com tracemalloc")
+    parser.add_argument("--baseline", default=ARQUIVO_BASELINE_PADRAO)
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    args = parser.parse_args(argv)
+
+    print(f"Dados sintéticos em {args.dados} (escala {args.escala}):")
+    caminhos = ensure_inputs(args.dados, args.paginas, args.escala)
+
+    print("Medições (melhor tempo; pico de memória alocada pela etapa):")
+    resultados = run_benchmarks(caminhos, args.repeticoes, not args.sem_memoria)
+    rss = diagnostico.peak_rss_mb()
+    if rss is not None:
+        print(f"Pico de memória residente do processo: {rss:.0f} MB")
+
+    codigo = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("escala") != args.escala:
+            print(f"Baseline em outra escala ({baseline.get('meta', {}).get('escala')}); comparação ignorada.")
+        else:
+            regressoes = compare(resultados, baseline, args.tolerancia)
+            for pagina, etapa, antes, agora in regressoes:
+                print(f"REGRESSÃO {pagina}/{etapa}: {antes:.3f}s -> {agora:.3f}s (+{(agora / antes - 1) * 100:.0f}%)")
+            if not regressoes:
+                print(f"Sem regressões em relação à baseline de {baseline['meta']['data']}.")
+            codigo = 1 if regressoes else 0
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": {**_metadata(args.escala), "pico_rss_mb": rss}, "resultados": resultados},
+                      f, indent=2, ensure_ascii=False)
+        print(f"Baseline gravada em {args.baseline}")
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import codecs
+import io
+
+import numpy as np
+import pandas as pd
+
+from datas import parse_timestamps
+from tabelas import HAS_PYARROW
+
+# ---------------------------------------------------------
+# LEITURA DO ARQUIVO DE COLETAS (CSV)
+# ---------------------------------------------------------
+
+COLUNA_COLABORADOR = 'Usuário Nome'
+COLUNA_OS = 'O.S.'
+COLUNA_DATA = 'Data da Operação'
+COLUNAS_DETALHE = ['Data da Operação', 'O.S.', 'Paciente', 'Paciente Nome', 'Detalhe Descrição']
+COLUNAS_USADAS = [COLUNA_COLABORADOR] + COLUNAS_DETALHE
+
+# Colunas com poucos valores distintos viram categoria (menos memória)
+COLUNAS_CATEGORIA = [COLUNA_COLABORADOR, 'Detalhe Descrição']
+
+TAMANHO_AMOSTRA = 256 * 1024
+TAMANHO_BLOCO_VALIDACAO = 4 * 1024 * 1024
+
+
+def _is_utf8(data, inicio=0):
+    """Valida o conteúdo como UTF-8 a partir de `inicio`, em blocos (sem montar o texto inteiro)."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for pos in range(inicio, len(data), TAMANHO_BLOCO_VALIDACAO):
+            decoder.decode(data[pos:pos + TAMANHO_BLOCO_VALIDACAO])
+        decoder.decode(b'', final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(data, sample_size=TAMANHO_AMOSTRA):
+    """
+    Codificação do arquivo: UTF-8 (com ou sem BOM) ou latin1. A amostra
+    inicial decide rápido os arquivos latin1; se ela parecer UTF-8, o resto
+    do arquivo também é validado, porque um byte latin1 mais adiante faria
+    o leitor devolver bytes em vez de texto.
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig' if _is_utf8(data, len(codecs.BOM_UTF8)) else 'latin1'
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        # final=False: um caractere cortado no fim da amostra não conta como erro
+        decoder.decode(data[:sample_size], final=len(data) <= sample_size)
+    except UnicodeDecodeError:
+        return 'latin1'
+    return 'utf-8' if len(data) <= sample_size or _is_utf8(data) else 'latin1'
+
+
+def _read(data, encoding, sep):
+    header = pd.read_csv(io.BytesIO(data), sep=sep, encoding=encoding, nrows=0).columns
+    usecols = [c for c in COLUNAS_USADAS if c in header]
+    df = None
+    if HAS_PYARROW:
+        # Sem dtype=: com ele o pyarrow tenta converter todas as colunas e falha em inteiros com célula vazia
+        df = pd.read_csv(io.BytesIO(data), sep=sep, encoding=encoding, usecols=usecols, engine='pyarrow')
+        if COLUNA_DATA in df.columns and not pd.api.types.is_string_dtype(df[COLUNA_DATA]):
+            df = None  # datas todas em ISO viraram datetime: relê mantendo o texto original
+    if df is None:
+        df = pd.read_csv(io.BytesIO(data), sep=sep, encoding=encoding, usecols=usecols, dtype={COLUNA_DATA: str})
+    for col in COLUNAS_CATEGORIA:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df[usecols]
+
+
+def load_coletas_csv(data, sep=";"):
+    """
+    Lê o CSV de coletas em uma única passada: codificação detectada (UTF-8
+    validado no arquivo inteiro, senão latin1), apenas as colunas usadas pela
+    página e tipos compactos.
+    """
+    return _read(data, detect_encoding(data), sep)
+
+
+# ---------------------------------------------------------
+# RESUMO E ÍNDICE POR COLABORADOR (calculados uma vez por arquivo)
+# ---------------------------------------------------------
+
+def has_required_columns(df):
+    return COLUNA_COLABORADOR in df.columns and COLUNA_OS in df.columns
+
+
+def summarize_by_collaborator(df):
+    """Quantidade de O.S. distintas por colaborador."""
+    resumo = df.groupby(COLUNA_COLABORADOR, observed=True)[COLUNA_OS].nunique().reset_index()
+    resumo.columns = ['Colaborador', 'Qtd. Pacientes Atendidos']
+    return resumo
+
+
+def summary_table(resumo):
+    """Resumo em ordem decrescente de pacientes, com a linha de TOTAL no final."""
+    tabela = resumo.sort_values(by='Qtd. Pacientes Atendidos', ascending=False).reset_index(drop=True)
+    total = pd.DataFrame([['TOTAL', tabela['Qtd. Pacientes Atendidos'].sum()]], columns=tabela.columns)
+    return pd.concat([tabela, total], ignore_index=True)
+
+
+def build_collaborator_index(df):
+    """
+    Colaborador -> posições das linhas no DataFrame, já sem O.S. repetida
+    (mesmo resultado de filtrar pelo colaborador e fazer drop_duplicates em 'O.S.').
+    """
+    unicos = ~df.duplicated(subset=[COLUNA_COLABORADOR, COLUNA_OS])
+    posicoes = np.flatnonzero(unicos.to_numpy())
+    nomes = df[COLUNA_COLABORADOR].iloc[posicoes]
+    grupos = nomes.groupby(nomes, observed=True).indices
+    return {nome: posicoes[idx] for nome, idx in grupos.items()}
+
+
+def prepare_coletas(data):
+    """Lê o CSV e monta resumo + índice por colaborador (resultado vai para o cache)."""
+    return build_coletas(load_coletas_csv(data))
+
+
+def build_coletas(df):
+    """
+    Resumo, índice por colaborador e atendimentos por hora de um DataFrame já
+    lido. A 'Data da Operação' convertida fica em "momentos", para o
+    histórico não precisar convertê-la de novo.
+    """
+    preparado = {"df": df, "resumo": None, "indice": None, "momentos": None, "atendimentos": None}
+    if has_required_columns(df):
+        preparado["resumo"] = summarize_by_collaborator(df)
+        preparado["indice"] = build_collaborator_index(df)
+        if COLUNA_DATA in df.columns:
+            preparado["momentos"] = parse_timestamps(df[COLUNA_DATA])
+            preparado["atendimentos"] = build_hourly_visits(df, preparado["momentos"])
+    return preparado
+
+
+def collaborator_detail(preparado, colaborador):
+    """Linhas de detalhe (O.S. únicas) do colaborador, via índice pré-calculado."""
+    df = preparado["df"]
+    posicoes = preparado["indice"].get(colaborador, np.empty(0, dtype=np.intp))
+    cols_existentes = [c for c in COLUNAS_DETALHE if c in df.columns]
+    return df.iloc[posicoes][cols_existentes]
+
+
+# ---------------------------------------------------------
+# PRODUTIVIDADE AO LONGO DO TEMPO (Data da Operação)
+# ---------------------------------------------------------
+# As datas são convertidas uma vez por arquivo e reduzidas a uma tabela
+# compacta de O.S. únicas por colaborador e hora; as séries por hora/dia, os
+# perfis por hora do dia e por turno saem dela sem reler o CSV.
+
+GRANULARIDADES = {"Hora": "h", "Dia": "D"}
+TURNOS = {"Madrugada": (0, 6), "Manhã": (6, 12), "Tarde": (12, 18), "Noite": (18, 24)}
+COLUNAS_SERIE = ['Colaborador', 'Período', 'Pacientes']
+
+
+def build_hourly_visits(df, momentos=None):
+    """
+    O.S. distintas de cada colaborador em cada hora: (Colaborador, O.S., Hora).
+    `momentos` é a 'Data da Operação' já convertida (parse_timestamps), se houver.
+    """
+    if momentos is None:
+        momentos = parse_timestamps(df[COLUNA_DATA])
+    tabela = pd.DataFrame({
+        'Colaborador': df[COLUNA_COLABORADOR].to_numpy(),
+        'O.S.': df[COLUNA_OS].to_numpy(),
+        'Hora': momentos.dt.floor('h').to_numpy(),
+    }).dropna()
+    return tabela.drop_duplicates().reset_index(drop=True)
+
+
+def productivity_series(preparado, granularidade="Hora", colaboradores=None):
+    """Pacientes (O.S. distintas) por colaborador em cada hora ou dia."""
+    atendimentos = preparado["atendimentos"]
+    if colaboradores is not None:
+        atendimentos = atendimentos[atendimentos['Colaborador'].isin(colaboradores)]
+    periodo = atendimentos['Hora'].dt.floor(GRANULARIDADES[granularidade])
+    unicos = pd.DataFrame({
+        'Colaborador': atendimentos['Colaborador'],
+        'Período': periodo,
+        'O.S.': atendimentos['O.S.'],
+    }).drop_duplicates()
+    serie = unicos.groupby(['Colaborador', 'Período'], observed=True).size()
+    return serie.rename('Pacientes').reset_index()[COLUNAS_SERIE]
+
+
+def _days_in_file(atendimentos):
+    return max(1, atendimentos['Hora'].dt.normalize().nunique())
+
+
+def hour_of_day_profile(preparado):
+    """Média diária de pacientes por colaborador em cada hora do dia (0 a 23)."""
+    atendimentos = preparado["atendimentos"]
+    contagem = pd.crosstab(atendimentos['Colaborador'], atendimentos['Hora'].dt.hour)
+    contagem = contagem.reindex(columns=range(24), fill_value=0)
+    return contagem / _days_in_file(atendimentos)
+
+
+def shift_profile(preparado):
+    """Média diária de pacientes por colaborador em cada turno."""
+    por_hora = hour_of_day_profile(preparado)
+    return pd.DataFrame(
+        {turno: por_hora.iloc[:, inicio:fim].sum(axis=1) for turno, (inicio, fim) in TURNOS.items()},
+        index=por_hora.index,
+    )
+
+
+def team_calendar(preparado):
+    """Pacientes da equipe inteira por dia x hora do dia (para o mapa de calor)."""
+    atendimentos = preparado["atendimentos"]
+    calendario = pd.crosstab(atendimentos['Hora'].dt.normalize(), atendimentos['Hora'].dt.hour)
+    calendario = calendario.reindex(columns=range(24), fill_value=0)
+    calendario.index = calendario.index.strftime('%d/%m/%Y')
+    return calendario.rename_axis(index='Dia', columns='Hora')
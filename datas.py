@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------
+# EXTRAÇÃO DE DATAS EM LOTE
+# ---------------------------------------------------------
+# Substitui o parse_date célula a célula: recebe a coluna inteira (valores
+# datetime, texto ou vazios) e extrai dd/mm/aa(aa) com uma única passada
+# vetorizada de regex sobre os textos.
+
+PADRAO_DATA = r'(\d{1,2})/(\d{1,2})/(\d{2,4})'
+PADRAO_DATA_HORA = PADRAO_DATA + r'(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?'
+
+
+def _from_parts(partes):
+    """
+    Monta datetime64 a partir das colunas extraídas (dia, mês, ano e, se
+    houver, hora, minuto, segundo). Anos com dois dígitos viram 20aa, com
+    três dígitos são inválidos; data ou hora inexistente vira NaT.
+    """
+    ano_txt = partes[2]
+    ano = ano_txt.astype(int)
+    ano = ano.where(ano_txt.str.len() != 2, ano + 2000)
+    ano = ano.where(ano_txt.str.len() != 3, 0)   # ano inválido -> NaT abaixo
+    campos = {'year': ano, 'month': partes[1].astype(int), 'day': partes[0].astype(int)}
+    valida = np.ones(len(partes), dtype=bool)
+    for coluna, nome, limite in zip(partes.columns[3:], ('hour', 'minute', 'second'), (24, 60, 60)):
+        campos[nome] = pd.to_numeric(partes[coluna]).fillna(0).astype(int)
+        valida &= (campos[nome] < limite).to_numpy()
+    return pd.to_datetime(pd.DataFrame(campos), errors='coerce').where(valida)
+
+
+def parse_dates(values):
+    """
+    Converte uma coluna de valores mistos em datas.
+
+    - datetime (ou Timestamp): usa a parte da data;
+    - texto: primeira ocorrência de dd/mm/aa ou dd/mm/aaaa; anos com dois
+      dígitos viram 20aa, anos com três dígitos são descartados;
+    - qualquer outro valor, ou data inexistente (ex.: 31/02), não é detectado.
+
+    Retorna (datas, nao_detectada): uma Series datetime64 normalizada para o
+    dia (NaT onde não houve data) e a máscara booleana correspondente.
+    """
+    serie = pd.Series(values, dtype=object).reset_index(drop=True)
+    n = len(serie)
+    datas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[s]")
+
+    is_dt = np.fromiter((isinstance(v, datetime) for v in serie), dtype=bool, count=n)
+    if is_dt.any():
+        datas[is_dt] = pd.to_datetime(serie[is_dt], errors='coerce').dt.normalize()
+
+    is_str = np.fromiter((isinstance(v, str) for v in serie), dtype=bool, count=n)
+    if is_str.any():
+        partes = serie[is_str].astype(str).str.extract(PADRAO_DATA)
+        partes = partes.dropna()
+        if not partes.empty:
+            datas[partes.index] = _from_parts(partes)
+
+    return datas, datas.isna().to_numpy()
+
+
+def parse_timestamps(values):
+    """
+    Converte textos de data e hora (dd/mm/aa(aa) hh:mm[:ss], como a 'Data da
+    Operação' das coletas) em datetime64, com as mesmas regras de ano de
+    parse_dates; sem hora, vale meia-noite. Textos ISO (aaaa-mm-dd hh:mm)
+    também são aceitos; o resto vira NaT. A Series devolvida mantém o
+    índice de `values`.
+    """
+    serie = pd.Series(values, dtype=object)
+    # Horários se repetem muito: converte só os textos distintos e espalha
+    codigos, distintos = pd.factorize(serie.astype('string').str.strip())
+    texto = pd.Series(distintos, dtype='string')
+    datas = pd.Series(pd.NaT, index=texto.index, dtype='datetime64[us]')
+
+    partes = texto.str.extract(PADRAO_DATA_HORA).dropna(subset=[0, 1, 2])
+    if not partes.empty:
+        datas[partes.index] = _from_parts(partes)
+    falhas = datas.isna().to_numpy()
+    if falhas.any():
+        datas[falhas] = pd.to_datetime(texto[falhas], format='ISO8601', errors='coerce')
+
+    convertidas = np.append(datas.to_numpy(), np.datetime64('NaT'))  # código -1 = vazio
+    return pd.Series(convertidas[codigos], index=serie.index)
+
+
+def format_dates(datas, vazio="Não detectada"):
+    """Datas no formato dd/mm/aaaa (texto), com marcador para as não detectadas."""
+    return datas.dt.strftime('%d/%m/%Y').fillna(vazio)
@@ -0,0 +1,198 @@
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------
+# ANÁLISE DE DESEMPENHO: CUBO DE AGREGADOS POR COLABORADOR
+# ---------------------------------------------------------
+# Uma vez por arquivo: descobre o bloco de colunas de cada colaborador,
+# "derrete" todos os blocos numa tabela longa (colaborador, critério,
+# avaliador, nota, contato) e calcula de uma vez a quantidade de avaliadores
+# e as médias por critério de todos os colaboradores.
+
+TEXTO_CONTATO = "Você tem contato suficiente com o(a) colaborador(a)"
+PADRAO_NOME_COLABORADOR = re.compile(r"colaborador\(a\) (.+?) para")
+PADRAO_CONTATO_SIM = r"^Sim"
+
+COLUNAS_LONGA = ['Colaborador', 'Critério', 'Avaliador', 'Nota', 'Contato']
+
+
+def read_survey(data, is_csv):
+    if is_csv:
+        return pd.read_csv(io.BytesIO(data))
+    return pd.read_excel(io.BytesIO(data))
+
+
+def clean_criterion(col):
+    """'1. Pontualidade 2' -> 'Pontualidade'."""
+    clean_name = re.sub(r'\s+\d+$', '', str(col)).strip()
+    return re.sub(r'^\d+\.\s*', '', clean_name)
+
+
+def map_collaborator_columns(columns):
+    """
+    Colaborador -> colunas do seu bloco: contato, notas e observações.
+    Critérios com o mesmo nome limpo ficam com a última coluna, na posição
+    da primeira (mesmo comportamento do dicionário de médias original).
+    """
+    collaborators_data = {}
+    current_collaborator = None
+
+    for col in columns:
+        texto = str(col)
+        # 1. Início de novo colaborador
+        if TEXTO_CONTATO in texto:
+            match = PADRAO_NOME_COLABORADOR.search(texto)
+            if match:
+                current_collaborator = match.group(1)
+                collaborators_data[current_collaborator] = {
+                    'coluna_contato': col,
+                    'colunas_notas': [],
+                    'criterios': {},
+                    'coluna_obs': None
+                }
+
+        # 2. Coluna de Observações fecha o bloco
+        elif current_collaborator and texto.strip().startswith("Observações:"):
+            collaborators_data[current_collaborator]['coluna_obs'] = col
+            current_collaborator = None
+
+        # 3. Coluna de Notas
+        elif current_collaborator:
+            info = collaborators_data[current_collaborator]
+            info['colunas_notas'].append(col)
+            info['criterios'][clean_criterion(col)] = col
+
+    return collaborators_data
+
+
+def contact_flags(df, mapa):
+    """Matriz avaliador x colaborador: respondeu 'Sim' à pergunta de contato?"""
+    return pd.DataFrame({
+        nome: df[info['coluna_contato']].astype(str).str.contains(PADRAO_CONTATO_SIM, case=False, na=False)
+        for nome, info in mapa.items()
+    }, index=df.index)
+
+
+def build_long_table(df, mapa, contato):
+    """Todas as notas de todos os blocos numa tabela longa."""
+    triplas = [
+        (nome, criterio, coluna)
+        for nome, info in mapa.items()
+        for criterio, coluna in info['criterios'].items()
+    ]
+    if not triplas or df.empty:
+        return pd.DataFrame(columns=COLUNAS_LONGA)
+
+    nomes, criterios, colunas = zip(*triplas)
+    notas = np.column_stack([pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=float) for c in colunas])
+    flags = contato[list(nomes)].to_numpy()
+
+    n_linhas, n_blocos = notas.shape
+    return pd.DataFrame({
+        'Colaborador': pd.Categorical(np.tile(nomes, n_linhas), categories=list(mapa)),
+        'Critério': np.tile(criterios, n_linhas),
+        'Avaliador': np.repeat(np.arange(n_linhas), n_blocos),
+        'Nota': notas.ravel(),
+        'Contato': flags.ravel(),
+    })
+
+
+def prepare_survey(data, is_csv):
+    """Lê a pesquisa e monta o cubo (resultado vai para o cache)."""
+    return build_survey_cube(read_survey(data, is_csv))
+
+
+def build_survey_cube(df):
+    """Cubo da pesquisa (tabela longa, contatos e médias) a partir do DataFrame já lido."""
+    mapa = map_collaborator_columns(df.columns)
+    contato = contact_flags(df, mapa)
+    longa = build_long_table(df, mapa, contato)
+
+    # Médias de todos os colaboradores x critérios num único groupby
+    avaliadas = longa[longa['Contato'].astype(bool)]
+    medias = avaliadas.groupby(['Colaborador', 'Critério'], observed=True, sort=False)['Nota'].mean()
+
+    return {
+        "df": df,
+        "mapa": mapa,
+        "contato": contato,
+        "longa": longa,
+        "avaliadores": contato.sum().astype(int),
+        "medias": medias,
+    }
+
+
+def collaborator_means(cubo, colaborador):
+    """Médias por critério do colaborador, na ordem das colunas da pesquisa."""
+    criterios = list(cubo["mapa"][colaborador]['criterios'])
+    try:
+        medias = cubo["medias"].xs(colaborador, level='Colaborador')
+    except KeyError:
+        medias = pd.Series(dtype=float)
+    df_medias = pd.DataFrame({'Critério': criterios, 'Média': medias.reindex(criterios).to_numpy()})
+    return df_medias.set_index('Critério')
+
+
+def ranking(cubo):
+    """Ranking geral: média dos critérios e número de avaliadores de cada colaborador."""
+    geral = cubo["medias"].groupby(level='Colaborador', observed=True).mean()
+    tabela = pd.DataFrame({
+        'Colaborador': cubo["avaliadores"].index,
+        'Avaliadores': cubo["avaliadores"].to_numpy(),
+        'Média Geral': geral.reindex(cubo["avaliadores"].index).to_numpy(),
+    })
+    return tabela.sort_values('Média Geral', ascending=False, na_position='last').reset_index(drop=True)
+
+
+def heatmap_matrix(cubo):
+    """Matriz colaborador x critério com as médias (para o mapa de calor)."""
+    return cubo["medias"].unstack('Critério')
+
+
+# ---------------------------------------------------------
+# OBSERVAÇÕES: FILTRO E PAGINAÇÃO NO SERVIDOR
+# ---------------------------------------------------------
+# A página mostra só um lote de observações por vez; o filtro por palavra é
+# aplicado aqui, e a exportação completa só é gerada quando pedida.
+
+OBSERVACOES_POR_PAGINA = 20
+COLUNAS_OBSERVACOES = ['Colaborador', 'Nº', 'Observação']
+
+
+def collaborator_observations(cubo, colaborador):
+    """Observações de quem tem contato com o colaborador, numeradas na ordem da pesquisa."""
+    coluna_obs = cubo["mapa"][colaborador]['coluna_obs']
+    if coluna_obs is None:
+        return pd.Series(dtype=object, name='Observação')
+    observacoes = cubo["df"].loc[cubo["contato"][colaborador].to_numpy(), coluna_obs].dropna()
+    return pd.Series(
+        observacoes.astype(str).to_numpy(),
+        index=pd.RangeIndex(1, len(observacoes) + 1, name='Nº'),
+        name='Observação',
+    )
+
+
+def filter_observations(observacoes, termo):
+    """Observações que contêm o termo (sem diferenciar maiúsculas); termo vazio devolve todas."""
+    termo = (termo or "").strip()
+    if not termo:
+        return observacoes
+    return observacoes[observacoes.str.contains(termo, case=False, regex=False)]
+
+
+def observations_page(observacoes, pagina, por_pagina=OBSERVACOES_POR_PAGINA):
+    """Apenas as observações da página pedida (1 = primeira)."""
+    return observacoes.iloc[(pagina - 1) * por_pagina:pagina * por_pagina]
+
+
+def export_observations_csv(cubo):
+    """CSV com as observações de todos os colaboradores (gerado só quando pedido)."""
+    partes = [
+        collaborator_observations(cubo, nome).reset_index().assign(Colaborador=nome)
+        for nome in cubo["mapa"]
+    ]
+    tabela = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_OBSERVACOES)
+    return tabela[COLUNAS_OBSERVACOES].to_csv(index=False).encode('utf-8')
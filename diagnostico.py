@@ -0,0 +1,183 @@
+import contextlib
+import heapq
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+# ---------------------------------------------------------
+# DIAGNÓSTICO: TEMPO E MEMÓRIA POR ETAPA
+# ---------------------------------------------------------
+# Cada execução de página é dividida em etapas nomeadas (leitura, cálculo,
+# gráfico, tabela...). Para cada etapa ficam o tempo, a memória residente
+# do processo ao final e, com o rastreamento ligado, o pico de memória
+# alocada (tracemalloc). Cada execução vira uma linha JSON num log local
+# com rotação, para comparar arquivos, páginas e dias.
+
+ARQUIVO_LOG_PADRAO = "diagnostico.log"
+TAMANHO_LOG_MB_PADRAO = 10
+BACKUPS_LOG = 5
+
+_LOGGER = None
+_LOCK_LOGGER = threading.Lock()
+
+
+def current_rss_mb():
+    """Memória residente atual do processo (MB), ou None se o sistema não informar."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo desde o início (MB)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024
+
+
+def get_logger(caminho=None):
+    """Logger único do diagnóstico: uma linha JSON por execução, com rotação por tamanho."""
+    global _LOGGER
+    with _LOCK_LOGGER:
+        if _LOGGER is None:
+            caminho = caminho or os.environ.get("DIAGNOSTICO_LOG_ARQUIVO", ARQUIVO_LOG_PADRAO)
+            max_mb = float(os.environ.get("DIAGNOSTICO_LOG_MAX_MB", TAMANHO_LOG_MB_PADRAO))
+            handler = logging.handlers.RotatingFileHandler(
+                caminho, maxBytes=int(max_mb * 1024 * 1024), backupCount=BACKUPS_LOG, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("dashboard.diagnostico")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _LOGGER = logger
+        return _LOGGER
+
+
+class StageTimer:
+    """
+    Mede as etapas de uma execução de página. `memoria=True` liga o
+    tracemalloc durante a execução (mais preciso, porém mais lento); o
+    pico é do processo inteiro, então sessões simultâneas se somam.
+    """
+
+    def __init__(self, pagina, sessao=None, memoria=False):
+        self.pagina = pagina
+        self.sessao = sessao
+        self.memoria = memoria
+        self.arquivos = []
+        self.etapas = []
+        self._inicio = time.perf_counter()
+        self._iniciou_tracemalloc = False
+        self._registro = None
+        if memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._iniciou_tracemalloc = True
+
+    def add_file(self, nome, tamanho):
+        self.arquivos.append({"nome": nome, "bytes": int(tamanho)})
+
+    @contextlib.contextmanager
+    def stage(self, nome):
+        if self.memoria and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            registro = {"etapa": nome, "segundos": time.perf_counter() - inicio, "rss_mb": current_rss_mb()}
+            if self.memoria and tracemalloc.is_tracing():
+                registro["pico_alocado_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            self.etapas.append(registro)
+
+    def finish(self):
+        """Encerra a medição e devolve o registro da execução (chamadas seguintes devolvem o mesmo)."""
+        if self._registro is None:
+            if self._iniciou_tracemalloc:
+                tracemalloc.stop()
+                self._iniciou_tracemalloc = False
+            self._registro = {
+                "quando": datetime.now().isoformat(timespec="seconds"),
+                "sessao": self.sessao,
+                "pagina": self.pagina,
+                "arquivos": self.arquivos,
+                "total_segundos": time.perf_counter() - self._inicio,
+                "rss_pico_mb": peak_rss_mb(),
+                "etapas": self.etapas,
+            }
+        return self._registro
+
+    def table(self):
+        """Etapas em tabela, para o painel."""
+        tabela = pd.DataFrame(self.etapas, columns=["etapa", "segundos", "rss_mb", "pico_alocado_mb"])
+        tabela.columns = ["Etapa", "Segundos", "RSS (MB)", "Pico alocado (MB)"]
+        return tabela.dropna(axis=1, how="all")
+
+
+def log_run(registro, logger=None):
+    """Acrescenta o registro da execução ao log (JSON em uma linha)."""
+    (logger or get_logger()).info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def _stage_rows(registro):
+    nomes = ", ".join(a["nome"] for a in registro.get("arquivos", []))
+    for etapa in registro.get("etapas", []):
+        yield {
+            "quando": registro["quando"],
+            "sessao": registro.get("sessao"),
+            "pagina": registro["pagina"],
+            "arquivos": nomes,
+            **etapa,
+        }
+
+
+_LEITURAS_LOG = {}   # (caminho, n) -> (inode, posição lida, n etapas mais lentas até ali)
+_LOCK_LEITURAS = threading.Lock()
+
+
+def slowest_stages(n=10, caminho=None):
+    """
+    As n etapas mais lentas do log atual (os arquivos rotacionados ficam de
+    fora). A leitura é incremental: cada chamada só interpreta as linhas
+    acrescentadas desde a anterior e guarda apenas as n maiores; se o
+    arquivo foi rotacionado, recomeça do início.
+    """
+    caminho = caminho or os.environ.get("DIAGNOSTICO_LOG_ARQUIVO", ARQUIVO_LOG_PADRAO)
+    colunas = ["quando", "sessao", "pagina", "arquivos", "etapa", "segundos"]
+    with _LOCK_LEITURAS:
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            return pd.DataFrame(columns=colunas)
+        inode, posicao, maiores = _LEITURAS_LOG.get((caminho, n), (None, 0, []))
+        if inode != info.st_ino or info.st_size < posicao:
+            posicao, maiores = 0, []
+        if info.st_size > posicao:
+            with open(caminho, "rb") as f:
+                f.seek(posicao)
+                bloco = f.read(info.st_size - posicao)
+            # Só linhas completas: uma gravação pela metade fica para a próxima leitura
+            fim = bloco.rfind(b"\n") + 1
+            novas = []
+            for texto in bloco[:fim].splitlines():
+                try:
+                    novas.extend(_stage_rows(json.loads(texto)))
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+                    continue
+            maiores = heapq.nlargest(n, maiores + novas, key=lambda linha: linha.get("segundos") or 0)
+            posicao += fim
+        _LEITURAS_LOG[(caminho, n)] = (info.st_ino, posicao, maiores)
+    return pd.DataFrame(maiores).reindex(columns=colunas)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# ---------------------------------------------------------
+# EXIBIÇÃO DE TABELAS E GRÁFICOS GRANDES
+# ---------------------------------------------------------
+# O navegador recebe só o que cabe na tela: rankings viram "N primeiros +
+# Outros", tabelas são ordenadas e paginadas no servidor e gráficos com
+# muitos pontos passam para traços WebGL.
+
+LIMITE_BARRAS = 40        # acima disso o ranking é desenhado como pontos (WebGL)
+LIMITE_WEBGL = 1000       # pontos a partir dos quais linhas e dispersões usam WebGL
+ALTURA_POR_ITEM = 24
+ALTURA_MINIMA = 300
+ALTURA_MAXIMA = 1200
+LINHAS_POR_PAGINA = 50
+
+
+def top_n_with_others(df, rotulo, valor, n, nome_outros="Outros"):
+    """
+    As `n` maiores linhas por `valor` e, se sobrar alguma, uma linha
+    "Outros (k)" com a soma das demais. Ordem decrescente.
+    """
+    ordenado = df.sort_values(valor, ascending=False, kind='stable')
+    if n is None or len(ordenado) <= n:
+        return ordenado.reset_index(drop=True)
+    resto = ordenado.iloc[n:]
+    outros = pd.DataFrame({rotulo: [f"{nome_outros} ({len(resto)})"], valor: [resto[valor].sum()]})
+    return pd.concat([ordenado.iloc[:n][[rotulo, valor]], outros], ignore_index=True)
+
+
+def page_count(total, por_pagina=LINHAS_POR_PAGINA):
+    return max(1, -(-total // por_pagina))
+
+
+def sorted_page(df, coluna, ascendente=True, pagina=1, por_pagina=LINHAS_POR_PAGINA):
+    """Ordena pela coluna (só a chave é ordenada) e devolve apenas as linhas da página pedida."""
+    chave = df[coluna].reset_index(drop=True)
+    ordem = chave.sort_values(ascending=ascendente, kind='stable', na_position='last').index.to_numpy()
+    return df.iloc[ordem[(pagina - 1) * por_pagina:pagina * por_pagina]]
+
+
+def chart_height(n_itens):
+    """Altura do gráfico proporcional aos itens desenhados, dentro de limites."""
+    return int(np.clip(n_itens * ALTURA_POR_ITEM + 120, ALTURA_MINIMA, ALTURA_MAXIMA))
+
+
+def render_mode(n_pontos):
+    """'webgl' para séries grandes, 'svg' para as pequenas (texto mais nítido)."""
+    return 'webgl' if n_pontos >= LIMITE_WEBGL else 'svg'
+
+
+def ranking_figure(df, rotulo, valor, titulo):
+    """
+    Ranking horizontal, com `df` já na ordem de exibição (primeiro item no
+    topo, como devolve top_n_with_others, com "Outros" por último). Barras com
+    rótulos enquanto couberem na tela; acima de LIMITE_BARRAS itens, pontos em
+    WebGL (Scattergl) na mesma ordem.
+    """
+    ordem_desenho = df.iloc[::-1]  # o Plotly desenha a primeira categoria embaixo
+    if len(ordem_desenho) <= LIMITE_BARRAS:
+        fig = px.bar(ordem_desenho, x=valor, y=rotulo, orientation='h', text_auto=True, title=titulo)
+        fig.update_traces(textposition='outside', cliponaxis=False)
+    else:
+        fig = px.scatter(ordem_desenho, x=valor, y=rotulo, render_mode='webgl', title=titulo)
+        fig.update_traces(marker=dict(size=7))
+    fig.update_layout(showlegend=False, height=chart_height(len(ordem_desenho)), margin=dict(r=50))
+    return fig
@@ -0,0 +1,175 @@
+import contextlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+import coletas
+from datas import parse_timestamps
+
+# ---------------------------------------------------------
+# HISTÓRICO ACUMULADO DE COLETAS (SQLite local)
+# ---------------------------------------------------------
+# Cada CSV diário é somado ao histórico uma única vez (o arquivo é
+# reconhecido pelo hash do conteúdo). O par O.S. + Usuário Nome é único no
+# histórico inteiro e fica no dia da sua primeira Data da Operação, então a
+# contagem de O.S. distintas por colaborador num período sai direto da soma
+# dos parciais diários, sem reler as coletas brutas.
+
+ARQUIVO_HISTORICO_PADRAO = "historico_coletas.sqlite"
+SEM_DATA = ""  # dia das O.S. sem Data da Operação legível (só entram no total geral)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS coletas (
+    os TEXT NOT NULL,
+    usuario TEXT NOT NULL,
+    dia TEXT NOT NULL,
+    data_operacao TEXT,
+    PRIMARY KEY (os, usuario)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS resumo_diario (
+    dia TEXT NOT NULL,
+    usuario TEXT NOT NULL,
+    os_unicas INTEGER NOT NULL,
+    PRIMARY KEY (dia, usuario)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cargas (
+    hash TEXT PRIMARY KEY,
+    arquivo TEXT,
+    recebido_em TEXT NOT NULL,
+    linhas INTEGER NOT NULL,
+    novas INTEGER NOT NULL
+);
+"""
+
+
+def _os_as_text(serie):
+    """O.S. como texto estável entre arquivos (1680 e 1680.0 viram '1680')."""
+    if pd.api.types.is_float_dtype(serie) and (serie % 1 == 0).all():
+        serie = serie.astype('Int64')
+    return serie.astype(str)
+
+
+def unique_pairs(df, momentos=None):
+    """
+    Pares O.S. + colaborador do arquivo, cada um com a sua primeira
+    Data da Operação: DataFrame (os, usuario, dia, data_operacao).
+    `momentos` é a Data da Operação já convertida (alinhada a `df`), se houver.
+    """
+    pares = df[[coletas.COLUNA_OS, coletas.COLUNA_COLABORADOR]].dropna()
+    texto_data = (
+        df.loc[pares.index, coletas.COLUNA_DATA]
+        if coletas.COLUNA_DATA in df.columns
+        else pd.Series(None, index=pares.index, dtype=object)
+    )
+    momentos = parse_timestamps(texto_data) if momentos is None else momentos.loc[pares.index]
+    pares = pd.DataFrame({
+        'os': _os_as_text(pares[coletas.COLUNA_OS]).to_numpy(),
+        'usuario': pares[coletas.COLUNA_COLABORADOR].astype(str).to_numpy(),
+        'momento': momentos.to_numpy(),
+        'data_operacao': texto_data.to_numpy(),
+    })
+    # Ordena por data (sem data por último) e fica com a primeira de cada par
+    pares = pares.sort_values('momento', kind='stable', na_position='last')
+    pares = pares.drop_duplicates(subset=['os', 'usuario'], keep='first')
+    pares['dia'] = pares['momento'].dt.strftime('%Y-%m-%d').fillna(SEM_DATA)
+    pares['data_operacao'] = pares['data_operacao'].where(pares['data_operacao'].notna(), None)
+    return pares[['os', 'usuario', 'dia', 'data_operacao']]
+
+
+class ColetasHistory:
+    """Histórico de coletas em um arquivo SQLite, com parciais diários por colaborador."""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or os.environ.get("COLETAS_HISTORICO_ARQUIVO", ARQUIVO_HISTORICO_PADRAO)
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.executescript(_ESQUEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with con:  # uma transação por operação
+                yield con
+        finally:
+            con.close()
+
+    def append(self, df, chave, arquivo=None, momentos=None):
+        """
+        Soma um arquivo de coletas já lido ao histórico. `chave` identifica o
+        conteúdo (hash): o mesmo arquivo enviado de novo não altera nada.
+        `momentos`: Data da Operação já convertida, reaproveitada de build_coletas.
+        Retorna {"novas": pares inéditos, "linhas": linhas do arquivo, "ja_carregado": bool}.
+        """
+        if not coletas.has_required_columns(df):
+            raise ValueError("O arquivo não possui as colunas 'Usuário Nome' e 'O.S.'.")
+
+        with self._lock, self._connect() as con:
+            if con.execute("SELECT 1 FROM cargas WHERE hash = ?", (chave,)).fetchone():
+                return {"novas": 0, "linhas": len(df), "ja_carregado": True}
+
+            pares = unique_pairs(df, momentos)
+            con.execute("CREATE TEMP TABLE novos (os TEXT, usuario TEXT, dia TEXT, data_operacao TEXT)")
+            con.executemany("INSERT INTO novos VALUES (?, ?, ?, ?)", zip(*(pares[c].tolist() for c in pares.columns)))
+            # Só o que ainda não existe no histórico entra nos parciais
+            con.execute(
+                "DELETE FROM novos WHERE EXISTS "
+                "(SELECT 1 FROM coletas c WHERE c.os = novos.os AND c.usuario = novos.usuario)"
+            )
+            con.execute("INSERT INTO coletas (os, usuario, dia, data_operacao) SELECT * FROM novos")
+            con.execute(
+                "INSERT INTO resumo_diario (dia, usuario, os_unicas) "
+                "SELECT dia, usuario, COUNT(*) FROM novos WHERE true GROUP BY dia, usuario "
+                "ON CONFLICT (dia, usuario) DO UPDATE SET os_unicas = os_unicas + excluded.os_unicas"
+            )
+            novas = con.execute("SELECT COUNT(*) FROM novos").fetchone()[0]
+            con.execute("DROP TABLE novos")
+            con.execute(
+                "INSERT INTO cargas (hash, arquivo, recebido_em, linhas, novas) VALUES (?, ?, ?, ?, ?)",
+                (chave, arquivo, datetime.now().isoformat(timespec='seconds'), len(df), novas),
+            )
+        return {"novas": novas, "linhas": len(df), "ja_carregado": False}
+
+    def summary(self, inicio=None, fim=None):
+        """
+        O.S. distintas por colaborador no período (datas inclusivas; None = sem
+        limite), no mesmo formato de coletas.summarize_by_collaborator.
+        """
+        filtros, params = [], []
+        if inicio is not None:
+            filtros.append("dia >= ?")
+            params.append(pd.Timestamp(inicio).strftime('%Y-%m-%d'))
+        if fim is not None:
+            filtros.append("dia <= ?")
+            params.append(pd.Timestamp(fim).strftime('%Y-%m-%d'))
+        if filtros:
+            filtros.append("dia <> ''")
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+        with self._connect() as con:
+            linhas = con.execute(
+                f"SELECT usuario, SUM(os_unicas) FROM resumo_diario {where} GROUP BY usuario ORDER BY usuario",
+                params,
+            ).fetchall()
+        return pd.DataFrame(linhas, columns=['Colaborador', 'Qtd. Pacientes Atendidos'])
+
+    def date_bounds(self):
+        """(primeiro dia, último dia) com coletas no histórico, ou (None, None)."""
+        with self._connect() as con:
+            inicio, fim = con.execute(
+                "SELECT MIN(dia), MAX(dia) FROM resumo_diario WHERE dia <> ''"
+            ).fetchone()
+        if inicio is None:
+            return None, None
+        return pd.Timestamp(inicio).date(), pd.Timestamp(fim).date()
+
+    def loads(self):
+        """Arquivos já somados ao histórico, do mais recente para o mais antigo."""
+        with self._connect() as con:
+            linhas = con.execute(
+                "SELECT arquivo, recebido_em, linhas, novas FROM cargas ORDER BY recebido_em DESC"
+            ).fetchall()
+        return pd.DataFrame(linhas, columns=['Arquivo', 'Recebido em', 'Linhas', 'O.S. novas'])
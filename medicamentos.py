@@ -0,0 +1,728 @@
+import colorsys
+import io
+import os
+import posixpath
+import time
+import traceback
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.colors import COLOR_INDEX, Color
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+from openpyxl.writer.theme import theme_xml as theme_xml_padrao
+
+from datas import format_dates, parse_dates
+
+# ---------------------------------------------------------
+# CLASSIFICAÇÃO DE CORES (Coluna G da aba CONTROLE)
+# ---------------------------------------------------------
+# As cores de tema e indexadas são convertidas para RGB de verdade, usando a
+# paleta do tema da própria planilha (xl/theme/theme1.xml), o tint e a tabela
+# de cores indexadas. Assim a detecção do verde não depende do tema escolhido
+# por quem montou a planilha. Cada cor distinta é resolvida uma única vez.
+
+NS_DRAWING = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+# Ordem dos índices de tema no Excel (lt1/dk1 e lt2/dk2 invertidos em relação ao XML)
+ORDEM_TEMA = ['lt1', 'dk1', 'lt2', 'dk2', 'accent1', 'accent2', 'accent3',
+              'accent4', 'accent5', 'accent6', 'hlink', 'folHlink']
+
+# Índices 64 e 65: cor de texto e de fundo do sistema
+CORES_SISTEMA = ['00000000', '00FFFFFF']
+
+
+def read_theme_palette(theme_xml):
+    """Lista RGB ('RRGGBB') das cores do tema, na ordem de índice usada pelas células."""
+    if not theme_xml:
+        theme_xml = theme_xml_padrao
+    root = ET.fromstring(theme_xml)
+    esquema = root.find(f"{NS_DRAWING}themeElements/{NS_DRAWING}clrScheme")
+    cores = {}
+    if esquema is not None:
+        for node in esquema:
+            nome = node.tag.replace(NS_DRAWING, "")
+            for cor in node:
+                if cor.tag == f"{NS_DRAWING}srgbClr":
+                    cores[nome] = cor.get("val")
+                elif cor.tag == f"{NS_DRAWING}sysClr":
+                    cores[nome] = cor.get("lastClr")
+    return [cores.get(nome, "000000") for nome in ORDEM_TEMA]
+
+
+def apply_tint(hex6, tint):
+    """Aplica o tint do Excel (ajuste de luminosidade em HLS) a uma cor 'RRGGBB'."""
+    if not tint:
+        return hex6.upper()
+    r, g, b = (int(hex6[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    if tint < 0:
+        l = l * (1 + tint)
+    else:
+        l = l * (1 - tint) + tint
+    r, g, b = colorsys.hls_to_rgb(h, l, s)
+    return "".join(f"{round(c * 255):02X}" for c in (r, g, b))
+
+
+def is_green_rgb(hex6):
+    """Regra do verde: G predominante e não muito escuro."""
+    if not hex6:
+        return False
+    try:
+        r = int(hex6[0:2], 16)
+        g = int(hex6[2:4], 16)
+        b = int(hex6[4:6], 16)
+    except ValueError:
+        return False
+    return g > r and g > b and g > 60
+
+
+class ColorResolver:
+    """Converte cores openpyxl (rgb/tema/indexada) em RGB e memoriza a classificação."""
+
+    def __init__(self, theme_xml=None, indexed_colors=None):
+        self.theme = read_theme_palette(theme_xml)
+        self.indexed = list(indexed_colors or COLOR_INDEX) + CORES_SISTEMA
+        self._memo = {}
+
+    def to_rgb(self, color):
+        """'RRGGBB' efetivo da cor, ou None (sem cor / automática)."""
+        if color is None:
+            return None
+        if color.type == 'rgb':
+            hex_code = color.rgb
+            if not isinstance(hex_code, str):
+                return None
+            hex_code = hex_code[2:] if len(hex_code) > 6 else hex_code
+            return hex_code.upper() if len(hex_code) == 6 else None
+        if color.type == 'theme':
+            if not 0 <= color.theme < len(self.theme):
+                return None
+            return apply_tint(self.theme[color.theme], color.tint)
+        if color.type == 'indexed':
+            if not 0 <= color.indexed < len(self.indexed):
+                return None
+            return apply_tint(self.indexed[color.indexed][-6:], color.tint)
+        return None
+
+    def classify(self, color):
+        """(descrição para o Modo Raio-X, é verde?) da cor, memorizado."""
+        if color is None:
+            return "Sem Preenchimento", False
+        chave = (color.type, color.value, color.tint)
+        resultado = self._memo.get(chave)
+        if resultado is None:
+            rgb = self.to_rgb(color)
+            if color.type == 'rgb':
+                desc = f"RGB: {color.rgb}"
+            elif color.type == 'theme':
+                desc = f"Tema: {color.theme} (Tint: {color.tint}) → #{rgb}"
+            elif color.type == 'indexed':
+                desc = f"Index: {color.indexed} → #{rgb}"
+            else:
+                desc = "Automática"
+            resultado = (desc, is_green_rgb(rgb))
+            self._memo[chave] = resultado
+        return resultado
+
+
+# ---------------------------------------------------------
+# LEITURA EM STREAMING DA ABA CONTROLE
+# ---------------------------------------------------------
+# Em vez de montar o modelo de objetos inteiro com openpyxl.load_workbook,
+# lê direto o XML do xlsx: styles.xml (preenchimentos e formatos numéricos)
+# e a aba alvo com iterparse, guardando apenas as colunas B, D e G a partir
+# da linha 8. As cores passam pelo ColorResolver acima e cada estilo de
+# célula é resolvido para a sua cor uma única vez.
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+ABA_CONTROLE = 'CONTROLE'
+LINHA_INICIAL = 8
+COL_PACIENTE, COL_MEDICAMENTO, COL_DATA = 2, 4, 7   # B, D, G
+COLUNAS_LIDAS = (COL_PACIENTE, COL_MEDICAMENTO, COL_DATA)
+
+# Preenchimento padrão do openpyxl (PatternFill() sem cor definida)
+_COR_PADRAO = Color()
+
+
+_COLUNAS_CACHE = {}
+
+
+def _split_ref(ref):
+    """'G12' -> (7, 12). Índice da coluna memorizado por letras (chamado para toda célula)."""
+    letras = ref.rstrip("0123456789")
+    col = _COLUNAS_CACHE.get(letras)
+    if col is None:
+        col = 0
+        for ch in letras.upper():
+            col = col * 26 + (ord(ch) - 64)
+        _COLUNAS_CACHE[letras] = col
+    return col, int(ref[len(letras):])
+
+
+def _last_row(ref, so_intervalo=False):
+    """
+    Última linha de 'A1' ou 'A1:C3'. Com `so_intervalo`, uma referência de
+    uma célula só conta 0 (mesclagem de uma célula não cria nada no openpyxl).
+    """
+    if not ref:
+        return 0
+    inicio, _, fim = ref.partition(":")
+    if so_intervalo and (not fim or fim == inicio):
+        return 0
+    return _split_ref(fim or inicio)[1]
+
+
+def _cast_number(value):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _text_content(node):
+    """Texto simples de <si>/<is>, sem formatação e sem os textos fonéticos (rPh)."""
+    partes = []
+    t = node.find(f"{NS}t")
+    if t is not None and t.text:
+        partes.append(t.text)
+    for r in node.findall(f"{NS}r"):
+        t = r.find(f"{NS}t")
+        if t is not None and t.text:
+            partes.append(t.text)
+    return "".join(partes)
+
+
+def _resolve_path(base, target):
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _rels_path(part):
+    pasta, nome = posixpath.split(part)
+    return posixpath.join(pasta, "_rels", nome + ".rels")
+
+
+def _read_rels(zf, part):
+    try:
+        root = ET.fromstring(zf.read(_rels_path(part)))
+    except KeyError:
+        return {}
+    return {rel.get("Id"): rel for rel in root.iter(f"{NS_PKG_REL}Relationship")}
+
+
+def _workbook_part(zf):
+    for rel in _read_rels(zf, "").values():
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return _resolve_path("", rel.get("Target"))
+    return "xl/workbook.xml"
+
+
+class _StyleTable:
+    """Estilos de célula (cellXfs) -> cor de preenchimento e formato de data, resolvidos uma vez."""
+
+    def __init__(self, zf, styles_part, theme_part):
+        self.fill_ids = []
+        self.date_styles = set()
+        self.timedelta_styles = set()
+        self.fill_colors = []
+        self._classificacao = {}
+
+        theme_xml = None
+        if theme_part:
+            try:
+                theme_xml = zf.read(theme_part)
+            except KeyError:
+                pass
+
+        try:
+            root = ET.fromstring(zf.read(styles_part)) if styles_part else None
+        except KeyError:
+            root = None
+        if root is None:
+            self.resolver = ColorResolver(theme_xml)
+            return
+
+        # Paleta indexada personalizada (substitui a padrão do Excel, se existir)
+        indexed = [c.get("rgb") for c in root.iterfind(f"{NS}colors/{NS}indexedColors/{NS}rgbColor")]
+        self.resolver = ColorResolver(theme_xml, indexed or None)
+
+        custom = {}
+        num_fmts = root.find(f"{NS}numFmts")
+        if num_fmts is not None:
+            for fmt in num_fmts.findall(f"{NS}numFmt"):
+                custom[int(fmt.get("numFmtId"))] = fmt.get("formatCode")
+
+        fills = root.find(f"{NS}fills")
+        if fills is not None:
+            for fill in fills.findall(f"{NS}fill"):
+                self.fill_colors.append(self._fill_color(fill))
+
+        cell_xfs = root.find(f"{NS}cellXfs")
+        if cell_xfs is not None:
+            for idx, xf in enumerate(cell_xfs.findall(f"{NS}xf")):
+                self.fill_ids.append(int(xf.get("fillId", 0)))
+                num_fmt_id = int(xf.get("numFmtId", 0))
+                fmt = custom.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id))
+                if fmt and is_date_format(fmt):
+                    self.date_styles.add(idx)
+                if fmt and is_timedelta_format(fmt):
+                    self.timedelta_styles.add(idx)
+
+    @staticmethod
+    def _fill_color(fill):
+        pattern = fill.find(f"{NS}patternFill")
+        if pattern is None:
+            return None  # gradientFill: não há cor de frente
+        fg = pattern.find(f"{NS}fgColor")
+        if fg is None:
+            return _COR_PADRAO
+        return Color.from_tree(fg)
+
+    def classify(self, style_id):
+        """(descrição da cor, é verde?) do estilo, memorizado por índice de estilo."""
+        resultado = self._classificacao.get(style_id)
+        if resultado is None:
+            if self.fill_ids:
+                fill_id = self.fill_ids[style_id] if style_id < len(self.fill_ids) else 0
+                color = self.fill_colors[fill_id] if fill_id < len(self.fill_colors) else _COR_PADRAO
+            else:
+                color = _COR_PADRAO
+            resultado = self.resolver.classify(color)
+            self._classificacao[style_id] = resultado
+        return resultado
+
+
+def _locate_sheet(zf, workbook_part, sheet_name):
+    """Caminho do XML da aba pedida (ou da aba ativa) e seu título."""
+    root = ET.fromstring(zf.read(workbook_part))
+    rels = _read_rels(zf, workbook_part)
+
+    epoch = CALENDAR_WINDOWS_1900
+    pr = root.find(f"{NS}workbookPr")
+    if pr is not None and pr.get("date1904") in ("1", "true"):
+        epoch = CALENDAR_MAC_1904
+
+    sheets = root.find(f"{NS}sheets").findall(f"{NS}sheet")
+    escolhida = next((s for s in sheets if s.get("name") == sheet_name), None)
+    if escolhida is None:
+        ativa = 0
+        views = root.find(f"{NS}bookViews")
+        if views is not None:
+            for view in views.findall(f"{NS}workbookView"):
+                if view.get("activeTab") is not None:
+                    ativa = int(view.get("activeTab"))
+                    break
+        escolhida = sheets[ativa]
+
+    rel = rels[escolhida.get(f"{NS_REL}id")]
+    sheet_part = _resolve_path(workbook_part, rel.get("Target"))
+
+    partes = {}
+    for r in rels.values():
+        tipo = r.get("Type", "").rsplit("/", 1)[-1]
+        if tipo in ("styles", "sharedStrings", "theme"):
+            partes[tipo] = _resolve_path(workbook_part, r.get("Target"))
+    return escolhida.get("name"), sheet_part, partes, epoch
+
+
+def sheet_names(data):
+    """Nomes das abas do xlsx, lidos só do workbook.xml."""
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        root = ET.fromstring(zf.read(_workbook_part(zf)))
+    return [s.get("name") for s in root.find(f"{NS}sheets").findall(f"{NS}sheet")]
+
+
+def _read_shared_strings(zf, shared_part, needed):
+    """Lê em streaming só as strings compartilhadas referenciadas pelas colunas lidas."""
+    strings = {}
+    if not needed or shared_part is None:
+        return strings
+    ultimo = max(needed)
+    idx = 0
+    with zf.open(shared_part) as fonte:
+        for _, node in ET.iterparse(fonte):
+            if node.tag == f"{NS}si":
+                if idx in needed:
+                    strings[idx] = _text_content(node).replace('x005F_', '')
+                node.clear()
+                idx += 1
+                if idx > ultimo:
+                    break
+    return strings
+
+
+def _cell_value(tipo, raw, style_id, styles, epoch, strings):
+    if raw is None:
+        return None
+    if tipo == 'n':
+        value = _cast_number(raw)
+        if style_id in styles.date_styles:
+            try:
+                return from_excel(value, epoch, timedelta=style_id in styles.timedelta_styles)
+            except (OverflowError, ValueError):
+                return "#VALUE!"
+        return value
+    if tipo == 's':
+        return strings[int(raw)]
+    if tipo == 'b':
+        return bool(int(raw))
+    if tipo == 'd':
+        return from_ISO8601(raw)
+    return raw  # 'str', 'e', 'inlineStr' (já convertido em texto)
+
+
+def scan_controle(data, sheet_name=ABA_CONTROLE, min_row=LINHA_INICIAL):
+    """
+    Varre a aba em streaming e guarda, por linha, as células brutas das colunas
+    B, D e G (tipo, valor, estilo), já com as strings compartilhadas usadas,
+    os estilos e o calendário do workbook. Nada é convertido ainda.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        workbook_part = _workbook_part(zf)
+        titulo, sheet_part, partes, epoch = _locate_sheet(zf, workbook_part, sheet_name)
+        styles = _StyleTable(zf, partes.get("styles"), partes.get("theme"))
+
+        celulas = {}          # linha -> {coluna: (tipo, valor bruto, estilo)}
+        strings_usadas = set()
+        max_row = 0
+        row_counter = 0
+        tag_row, tag_c, tag_v, tag_is = f"{NS}row", f"{NS}c", f"{NS}v", f"{NS}is"
+        tag_merge, tag_link = f"{NS}mergeCell", f"{NS}hyperlink"
+
+        with zf.open(sheet_part) as fonte:
+            for _, elem in ET.iterparse(fonte):
+                if elem.tag != tag_row:
+                    # Como no openpyxl, mesclagens e hyperlinks criam células e estendem a última linha
+                    if elem.tag == tag_merge:
+                        max_row = max(max_row, _last_row(elem.get("ref"), so_intervalo=True))
+                    elif elem.tag == tag_link:
+                        max_row = max(max_row, _last_row(elem.get("ref")))
+                    continue
+                r = elem.get("r")
+                row_counter = int(float(r)) if r else row_counter + 1
+                col_counter = 0
+                linha = None
+                for c in elem:
+                    if c.tag != tag_c:
+                        continue
+                    ref = c.get("r")
+                    if ref:
+                        col, row = _split_ref(ref)
+                    else:
+                        col = col_counter + 1
+                        row = row_counter
+                    col_counter = col
+                    if row > max_row:
+                        max_row = row
+                    if row < min_row or col not in COLUNAS_LIDAS:
+                        continue
+                    tipo = c.get("t", "n")
+                    style_id = int(c.get("s", 0))
+                    if tipo == "inlineStr":
+                        node = c.find(tag_is)
+                        raw = _text_content(node) if node is not None else None
+                    else:
+                        raw = c.findtext(tag_v) or None
+                        if tipo == "s" and raw is not None:
+                            strings_usadas.add(int(raw))
+                    if linha is None:
+                        linha = celulas.setdefault(row, {})
+                    linha[col] = (tipo, raw, style_id)
+                elem.clear()
+
+        # Comentários também criam a célula no openpyxl
+        for rel in _read_rels(zf, sheet_part).values():
+            if rel.get("Type", "").endswith("/comments"):
+                comentarios = ET.fromstring(zf.read(_resolve_path(sheet_part, rel.get("Target"))))
+                for comentario in comentarios.iter(f"{NS}comment"):
+                    max_row = max(max_row, _last_row(comentario.get("ref")))
+
+        strings = _read_shared_strings(zf, partes.get("sharedStrings"), strings_usadas)
+
+    return {
+        "titulo_aba": titulo,
+        "celulas": celulas,
+        "linhas": range(min_row, max_row + 1),
+        "styles": styles,
+        "epoch": epoch,
+        "strings": strings,
+    }
+
+
+_CELULA_VAZIA = ('n', None, 0)
+
+
+def evaluate_rows(leitura, numeros):
+    """Converte e classifica apenas as linhas pedidas de uma varredura (colunas para build_extract)."""
+    celulas, styles, epoch, strings = leitura["celulas"], leitura["styles"], leitura["epoch"], leitura["strings"]
+    colunas = {"Linha": [], "Paciente": [], "Medicamento": [], "Valor": [], "Cor Detectada": [], "É Verde": []}
+    for i in numeros:
+        linha = celulas.get(i, {})
+        valores = {}
+        for col in COLUNAS_LIDAS:
+            tipo, raw, style_id = linha.get(col, _CELULA_VAZIA)
+            valores[col] = _cell_value(tipo, raw, style_id, styles, epoch, strings)
+        cor, verde = styles.classify(linha.get(COL_DATA, _CELULA_VAZIA)[2])
+        colunas["Linha"].append(i)
+        colunas["Paciente"].append(valores[COL_PACIENTE])
+        colunas["Medicamento"].append(valores[COL_MEDICAMENTO])
+        colunas["Valor"].append(valores[COL_DATA])
+        colunas["Cor Detectada"].append(cor)
+        colunas["É Verde"].append(verde)
+    return colunas
+
+
+def row_fingerprints(leitura):
+    """
+    Impressão digital de cada linha da varredura: valores de B, D e G (texto
+    das strings compartilhadas, não o índice) e o que o estilo muda no
+    resultado (formato de data e, em G, a cor classificada). Duas varreduras
+    com a mesma impressão numa linha produzem a mesma linha no extrato.
+    """
+    celulas, styles, strings = leitura["celulas"], leitura["styles"], leitura["strings"]
+    assinaturas = {}
+    impressoes = {}
+    for i in leitura["linhas"]:
+        linha = celulas.get(i, {})
+        partes = []
+        for col in COLUNAS_LIDAS:
+            tipo, raw, style_id = linha.get(col, _CELULA_VAZIA)
+            if tipo == 's' and raw is not None:
+                raw = strings[int(raw)]
+            estilo = assinaturas.get((col, style_id))
+            if estilo is None:
+                estilo = (style_id in styles.date_styles, style_id in styles.timedelta_styles)
+                if col == COL_DATA:
+                    estilo += styles.classify(style_id)
+                assinaturas[(col, style_id)] = estilo
+            partes.append((tipo, raw, estilo))
+        impressoes[i] = hash(tuple(partes))
+    return impressoes
+
+
+def read_controle(data, sheet_name=ABA_CONTROLE, min_row=LINHA_INICIAL):
+    """
+    Lê as colunas B (paciente), D (medicamento) e G (data + cor) da aba
+    CONTROLE (ou da aba ativa) sem carregar o workbook inteiro.
+    Retorna o mesmo extrato que a leitura via openpyxl.load_workbook.
+    """
+    leitura = scan_controle(data, sheet_name, min_row)
+    return {"titulo_aba": leitura["titulo_aba"], "linhas": build_extract(evaluate_rows(leitura, leitura["linhas"]))}
+
+
+def build_extract(colunas):
+    """
+    DataFrame do extrato (uma linha por linha da planilha), com a coluna G já
+    convertida em data pelo parser em lote. Valores mistos ficam como object.
+    """
+    linhas = pd.DataFrame({
+        "Linha": pd.Series(colunas["Linha"], dtype="int64"),
+        "Paciente": pd.Series(colunas["Paciente"], dtype=object),
+        "Medicamento": pd.Series(colunas["Medicamento"], dtype=object),
+        "Valor": pd.Series(colunas["Valor"], dtype=object),
+        "Cor Detectada": pd.Series(colunas["Cor Detectada"], dtype=object),
+        "É Verde": pd.Series(colunas["É Verde"], dtype=bool),
+    })
+    linhas["Data"], _ = parse_dates(linhas["Valor"])
+    return linhas
+
+
+def overdue(linhas, hoje):
+    """Linhas verdes com data anterior a hoje, com os dias de atraso (aritmética de colunas)."""
+    hoje = pd.Timestamp(hoje)
+    atrasadas = linhas[linhas["É Verde"].to_numpy() & (linhas["Data"] < hoje).to_numpy()]
+    return pd.DataFrame({
+        "Linha": atrasadas["Linha"].to_numpy(),
+        "Nome do Paciente": atrasadas["Paciente"].to_numpy(),
+        "Medicamento": atrasadas["Medicamento"].to_numpy(),
+        "Data Prevista": format_dates(atrasadas["Data"]).to_numpy(),
+        "Dias de Atraso": (hoje - atrasadas["Data"]).dt.days.to_numpy(),
+    })
+
+
+# ---------------------------------------------------------
+# MODO RAIO-X (montado só quando pedido, paginado)
+# ---------------------------------------------------------
+
+FILTROS_RAIO_X = {
+    "Todas as linhas": lambda verde, com_data: np.ones(len(verde), dtype=bool),
+    "Com data, mas não verde": lambda verde, com_data: com_data & ~verde,
+    "Verdes sem data detectada": lambda verde, com_data: verde & ~com_data,
+    "Somente verdes": lambda verde, com_data: verde,
+}
+LINHAS_POR_PAGINA_RAIO_X = 200
+
+
+def xray_filter(extrato, filtro):
+    """Posições (no extrato) das linhas que atendem ao filtro do Raio-X."""
+    linhas = extrato['linhas']
+    mascara = FILTROS_RAIO_X[filtro](linhas["É Verde"].to_numpy(), linhas["Data"].notna().to_numpy())
+    return np.flatnonzero(mascara)
+
+
+def xray_page(extrato, posicoes, pagina, por_pagina=LINHAS_POR_PAGINA_RAIO_X):
+    """Tabela do Raio-X apenas para as linhas da página pedida (1 = primeira)."""
+    linhas = extrato['linhas'].iloc[posicoes[(pagina - 1) * por_pagina:pagina * por_pagina]]
+    return pd.DataFrame({
+        "Linha Excel": linhas["Linha"].to_numpy(),
+        "Paciente": linhas["Paciente"].to_numpy(),
+        "Conteúdo Coluna G": [str(v) for v in linhas["Valor"]],
+        "Data Entendida": format_dates(linhas["Data"]).to_numpy(),
+        "Cor Detectada": linhas["Cor Detectada"].to_numpy(),
+        "É Verde?": np.where(linhas["É Verde"].to_numpy(), "SIM", "NÃO"),
+    })
+
+
+# ---------------------------------------------------------
+# VÁRIAS UNIDADES EM PARALELO (um processo por planilha)
+# ---------------------------------------------------------
+# Cada unidade tem a sua planilha CONTROLE. A leitura é CPU-bound (XML em
+# Python), então threads não ajudam: as planilhas vão para um pool de
+# processos e cada resultado volta assim que a sua planilha termina. Com
+# núcleos suficientes, o tempo total fica perto do da maior planilha.
+
+EXTENSOES_CONTROLE = (".xlsx", ".xlsm")
+COLUNAS_TEMPOS = ["Unidade", "Status", "Linhas", "Atrasados", "Leitura (s)", "Atrasos (s)",
+                  "Total no processo (s)", "Concluído após (s)", "Erro"]
+
+
+def unit_name(nome):
+    """Nome da unidade a partir do nome do arquivo (sem pasta e sem extensão)."""
+    return os.path.splitext(os.path.basename(nome))[0]
+
+
+def list_controle_files(pasta):
+    """
+    Planilhas .xlsx/.xlsm de uma pasta do servidor, incluindo subpastas:
+    lista de (unidade, caminho). A unidade é o caminho relativo sem extensão,
+    então "Unidade A/CONTROLE.xlsx" e "Unidade B/CONTROLE.xlsx" não se confundem.
+    """
+    if not os.path.isdir(pasta):
+        raise FileNotFoundError(f"Pasta não encontrada: {pasta}")
+    itens = []
+    for raiz, subpastas, arquivos in os.walk(pasta):
+        subpastas.sort()
+        for nome in sorted(arquivos):
+            if nome.lower().endswith(EXTENSOES_CONTROLE) and not nome.startswith(("~$", ".")):
+                caminho = os.path.join(raiz, nome)
+                itens.append((os.path.splitext(os.path.relpath(caminho, pasta))[0], caminho))
+    return itens
+
+
+def unique_units(entradas):
+    """Acrescenta (2), (3)... a unidades repetidas, para cada planilha ter o seu rótulo."""
+    vistos = {}
+    resultado = []
+    for unidade, origem in entradas:
+        vistos[unidade] = vistos.get(unidade, 0) + 1
+        resultado.append((unidade if vistos[unidade] == 1 else f"{unidade} ({vistos[unidade]})", origem))
+    return resultado
+
+
+def _unit_record(unidade):
+    return {"unidade": unidade, "status": "ok", "linhas": 0, "atrasados": None,
+            "leitura": 0.0, "atrasos": 0.0, "erro": ""}
+
+
+def _lost_unit(unidade, erro):
+    """Registro de uma planilha cujo processo morreu (ex.: falta de memória) antes de responder."""
+    registro = _unit_record(unidade)
+    registro.update(status="erro", erro=f"{type(erro).__name__}: {erro}", total=0.0, pool_quebrado=True)
+    return registro
+
+
+def scan_unit(unidade, origem, hoje):
+    """
+    Atrasados de uma unidade. `origem` é o conteúdo (bytes) ou o caminho da
+    planilha. Roda no processo do pool; nunca lança exceção, para as outras
+    unidades continuarem.
+    """
+    registro = _unit_record(unidade)
+    inicio = time.perf_counter()
+    try:
+        if isinstance(origem, str):
+            with open(origem, "rb") as f:
+                origem = f.read()
+        extrato = read_controle(origem)
+        registro["leitura"] = time.perf_counter() - inicio
+        registro["linhas"] = len(extrato["linhas"])
+        marca = time.perf_counter()
+        registro["atrasados"] = overdue(extrato["linhas"], hoje)
+        registro["atrasos"] = time.perf_counter() - marca
+    except Exception as e:
+        registro["status"] = "erro"
+        registro["erro"] = f"{type(e).__name__}: {e}"
+        registro["detalhe"] = traceback.format_exc()
+    registro["total"] = time.perf_counter() - inicio
+    return registro
+
+
+def scan_units(entradas, hoje, pool=None, processos=None):
+    """
+    Processa as planilhas `entradas` [(unidade, bytes ou caminho)] em
+    paralelo e devolve os registros de scan_unit à medida que terminam, cada
+    um com "concluido" (segundos desde o início do lote). Usa o `pool`
+    informado (já aquecido) ou cria um só para este lote. Se o pool quebrar,
+    as planilhas afetadas voltam como erro com "pool_quebrado": o pool
+    informado não serve mais e precisa ser recriado.
+    """
+    inicio = time.perf_counter()
+    proprio = pool is None
+    if proprio:
+        processos = max(1, min(processos or os.cpu_count() or 1, len(entradas) or 1))
+        pool = ProcessPoolExecutor(max_workers=processos)
+    try:
+        futuros = {}
+        for unidade, origem in entradas:
+            try:
+                futuros[pool.submit(scan_unit, unidade, origem, hoje)] = unidade
+            except BrokenProcessPool as e:
+                registro = _lost_unit(unidade, e)
+                registro["concluido"] = time.perf_counter() - inicio
+                yield registro
+        for futuro in as_completed(futuros):
+            # Se um processo morre, o pool quebra e todas as planilhas pendentes falham com ele
+            try:
+                registro = futuro.result()
+            except BrokenProcessPool as e:
+                registro = _lost_unit(futuros[futuro], e)
+            registro["concluido"] = time.perf_counter() - inicio
+            yield registro
+    finally:
+        if proprio:
+            pool.shutdown(cancel_futures=True)
+
+
+def consolidate_overdue(registros):
+    """Uma tabela de atrasados com a coluna Unidade, dos mais atrasados para os menos."""
+    tabelas = [
+        r["atrasados"].assign(Unidade=r["unidade"])
+        for r in registros
+        if r["atrasados"] is not None and not r["atrasados"].empty
+    ]
+    if not tabelas:
+        return pd.DataFrame(columns=["Unidade", "Linha", "Nome do Paciente", "Medicamento",
+                                     "Data Prevista", "Dias de Atraso"])
+    consolidado = pd.concat(tabelas, ignore_index=True)
+    consolidado = consolidado[["Unidade"] + [c for c in consolidado.columns if c != "Unidade"]]
+    return consolidado.sort_values(["Dias de Atraso", "Unidade", "Linha"], ascending=[False, True, True],
+                                   kind="stable", ignore_index=True)
+
+
+def timing_table(registros):
+    """Tempo de cada planilha (leitura, atrasos, total no processo e momento em que ficou pronta)."""
+    return pd.DataFrame([
+        [r["unidade"], r["status"], r["linhas"],
+         len(r["atrasados"]) if r["atrasados"] is not None else None,
+         round(r["leitura"], 3), round(r["atrasos"], 3), round(r["total"], 3),
+         round(r["concluido"], 3), r["erro"]]
+        for r in registros
+    ], columns=COLUNAS_TEMPOS).astype({"Linhas": "int64", "Atrasados": "Int64"})
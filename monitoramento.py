@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+import medicamentos
+from parse_cache import content_hash
+
+# ---------------------------------------------------------
+# PLANILHA CONTROLE MONITORADA (pasta compartilhada)
+# ---------------------------------------------------------
+# Em vez de um novo upload a cada alteração, a planilha é lida direto de um
+# caminho local configurado. Cada linha ganha uma impressão digital (valores
+# e estilo de B, D e G); quando o arquivo muda, só as linhas com impressão
+# diferente são convertidas e classificadas de novo. A lista de atrasados
+# fica pronta em memória e, na virada do dia, só a aritmética de datas é
+# refeita sobre as linhas verdes já conhecidas.
+
+INTERVALO_PADRAO = 30  # segundos entre verificações do arquivo
+
+
+class ControleWatcher:
+    """
+    Extrato e atrasados de uma planilha CONTROLE no disco, atualizados de
+    forma incremental. `refresh()` verifica o arquivo (só data e tamanho,
+    se nada mudou); `start()` faz isso numa thread em segundo plano.
+    """
+
+    def __init__(self, caminho, sheet_name=medicamentos.ABA_CONTROLE, min_row=medicamentos.LINHA_INICIAL):
+        self.caminho = caminho
+        self.sheet_name = sheet_name
+        self.min_row = min_row
+        self.extrato = None
+        self.versao = 0
+        self.erro = None
+        self.atualizado_em = None
+        self.verificado_em = None
+        self.ultima_mudanca = None
+        self._assinatura = None
+        self._hash = None
+        self._epoch = None
+        self._impressoes = {}
+        self._candidatas = None
+        self._atrasados = (None, None)   # (versão, dia) -> tabela
+        self._lock = threading.Lock()            # estado exposto (extrato, atrasados)
+        self._lock_leitura = threading.Lock()    # uma releitura por vez
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _file_signature(self):
+        info = os.stat(self.caminho)
+        return info.st_mtime_ns, info.st_size
+
+    def refresh(self):
+        """Relê a planilha se ela mudou no disco. Retorna True se o extrato foi atualizado."""
+        with self._lock_leitura:
+            self.verificado_em = datetime.now()
+            try:
+                assinatura = self._file_signature()
+                if assinatura == self._assinatura:
+                    return False
+                with open(self.caminho, "rb") as f:
+                    data = f.read()
+                chave = content_hash(data)
+                if chave == self._hash:
+                    self._assinatura = assinatura
+                    return False
+                inicio = time.perf_counter()
+                leitura = medicamentos.scan_controle(data, self.sheet_name, self.min_row)
+                self._apply(leitura, inicio)
+            except Exception as e:
+                # Arquivo ausente ou salvo pela metade: mantém o último extrato bom e tenta de novo depois
+                self.erro = f"{type(e).__name__}: {e}"
+                return False
+            self._assinatura, self._hash = assinatura, chave
+            self.erro = None
+            return True
+
+    def _apply(self, leitura, inicio):
+        """Reavalia só as linhas novas ou com impressão digital diferente e troca o extrato."""
+        impressoes = medicamentos.row_fingerprints(leitura)
+        completa = self.extrato is None or leitura["epoch"] != self._epoch
+        if completa:
+            alteradas = list(leitura["linhas"])
+            removidas = []
+        else:
+            anteriores = self._impressoes
+            alteradas = [i for i, impressao in impressoes.items() if anteriores.get(i) != impressao]
+            removidas = [i for i in anteriores if i not in impressoes]
+
+        if completa:
+            linhas = medicamentos.build_extract(medicamentos.evaluate_rows(leitura, alteradas))
+        elif alteradas or removidas:
+            base = self.extrato["linhas"]
+            mantidas = base[~base["Linha"].isin(alteradas + removidas).to_numpy()]
+            partes = [mantidas]
+            if alteradas:
+                partes.append(medicamentos.build_extract(medicamentos.evaluate_rows(leitura, alteradas)))
+            linhas = pd.concat(partes, ignore_index=True)
+            linhas = linhas.sort_values("Linha", kind="stable").reset_index(drop=True)
+        else:
+            linhas = self.extrato["linhas"]
+        candidatas = linhas[linhas["É Verde"].to_numpy() & linhas["Data"].notna().to_numpy()]
+
+        # Troca tudo de uma vez: quem já leu o extrato anterior continua com uma versão consistente
+        with self._lock:
+            self.extrato = {"titulo_aba": leitura["titulo_aba"], "linhas": linhas}
+            self._candidatas = candidatas
+            self._impressoes = impressoes
+            self._epoch = leitura["epoch"]
+            self.versao += 1
+            self.atualizado_em = datetime.now()
+            self.ultima_mudanca = {
+                "completa": completa,
+                "reavaliadas": len(alteradas),
+                "removidas": len(removidas),
+                "total": len(linhas),
+                "segundos": time.perf_counter() - inicio,
+            }
+
+    def overdue(self, hoje=None):
+        """Atrasados na data pedida; a tabela é refeita só quando a versão ou o dia mudam."""
+        hoje = hoje or date.today()
+        with self._lock:
+            if self._candidatas is None:
+                return None
+            chave, tabela = self._atrasados
+            if chave != (self.versao, hoje):
+                tabela = medicamentos.overdue(self._candidatas, hoje)
+                self._atrasados = ((self.versao, hoje), tabela)
+            return tabela
+
+    def status(self):
+        with self._lock:
+            return {
+                "caminho": self.caminho,
+                "versao": self.versao,
+                "erro": self.erro,
+                "atualizado_em": self.atualizado_em,
+                "verificado_em": self.verificado_em,
+                "ultima_mudanca": self.ultima_mudanca,
+            }
+
+    def start(self, intervalo=None):
+        """Verifica o arquivo periodicamente numa thread daemon e mantém os atrasados de hoje prontos."""
+        if self._thread is not None:
+            return
+        self._parar.clear()
+        intervalo = intervalo or float(os.environ.get("MEDICAMENTOS_MONITOR_INTERVALO", INTERVALO_PADRAO))
+
+        def laco():
+            while not self._parar.is_set():
+                self.refresh()
+                self.overdue()
+                self._parar.wait(intervalo)
+
+        self._thread = threading.Thread(target=laco, name=f"monitor-{os.path.basename(self.caminho)}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,234 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+
+# ---------------------------------------------------------
+# ORGANIZADOR DE NOTAS: ORIGENS DOS NOMES DE ARQUIVO
+# ---------------------------------------------------------
+# A página só precisa do nome de cada PDF. Em vez de receber milhares de PDFs
+# pelo upload, os nomes podem vir do diretório central de um ZIP (sem
+# descompactar nada) ou de uma pasta local do servidor.
+
+EXTENSAO_NOTA = ".pdf"
+
+
+def _is_note(nome):
+    return nome.lower().endswith(EXTENSAO_NOTA)
+
+
+def list_zip_entries(arquivo_zip):
+    """
+    PDFs dentro de um ZIP (caminho ou objeto de arquivo), lidos só do
+    diretório central: lista de (nome do arquivo, caminho da entrada no ZIP).
+    """
+    with zipfile.ZipFile(arquivo_zip) as zf:
+        return [
+            (posixpath.basename(info.filename), info.filename)
+            for info in zf.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and _is_note(info.filename)
+        ]
+
+
+def list_folder_entries(pasta):
+    """PDFs de uma pasta local do servidor (incluindo subpastas): lista de (nome, caminho)."""
+    if not os.path.isdir(pasta):
+        raise FileNotFoundError(f"Pasta não encontrada: {pasta}")
+    itens = []
+    for raiz, _, arquivos in os.walk(pasta):
+        itens.extend((nome, os.path.join(raiz, nome)) for nome in sorted(arquivos) if _is_note(nome))
+    return itens
+
+
+# ---------------------------------------------------------
+# CLASSIFICAÇÃO DOS NOMES DE ARQUIVO
+# ---------------------------------------------------------
+# Padrões testados em ordem; o primeiro que casar define empresa e número.
+# Cada padrão precisa dos grupos nomeados "empresa" e "numero". Novos
+# padrões de fornecedores podem ser acrescentados aqui ou num arquivo JSON
+# (lista de {"nome": ..., "regex": ...}) indicado em NOTAS_PADROES_ARQUIVO.
+
+PADROES_NOTAS = [
+    {"nome": "C Num - Nome", "regex": r"^C\s+(?P<numero>\d+)\s*[-]\s*(?P<empresa>.+)\.pdf"},
+    {"nome": "Nome - Num", "regex": r"^(?P<empresa>.+?)\s*[-]\s*(?P<numero>\d+)"},
+]
+
+TAMANHO_LOTE = 500
+INTERVALO_PROGRESSO = 0.25  # segundos entre atualizações da barra
+
+
+def load_patterns(caminho=None):
+    """Padrões padrão + os do arquivo JSON (se houver)."""
+    padroes = list(PADROES_NOTAS)
+    caminho = caminho or os.environ.get("NOTAS_PADROES_ARQUIVO")
+    if caminho and os.path.isfile(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            padroes.extend(json.load(f))
+    return padroes
+
+
+class NoteClassifier:
+    """Classifica nomes de arquivo de notas em (empresa, número) com padrões pré-compilados."""
+
+    def __init__(self, padroes=None):
+        padroes = PADROES_NOTAS if padroes is None else padroes
+        self.padroes = [(p["nome"], re.compile(p["regex"], re.IGNORECASE)) for p in padroes]
+
+    def classify(self, nome_arquivo):
+        for _, regex in self.padroes:
+            match = regex.search(nome_arquivo)
+            if match:
+                empresa = match.group("empresa").upper().strip()
+                numero = match.group("numero")
+                if empresa and numero:
+                    return empresa, numero
+                return None, None
+        return None, None
+
+    def run(self, itens, progresso=None, lote=TAMANHO_LOTE, intervalo=INTERVALO_PROGRESSO):
+        """
+        Classifica (nome, origem) em lotes. `progresso(fração)` é chamado no
+        máximo a cada `intervalo` segundos (e uma vez no final).
+        """
+        agrupamento = {}
+        nao_lidos = []
+        classificados = []
+        total = len(itens)
+        inicio = ultimo_aviso = time.perf_counter()
+
+        for pos in range(0, total, lote):
+            for nome_arquivo, origem in itens[pos:pos + lote]:
+                empresa, numero = self.classify(nome_arquivo)
+                if empresa:
+                    agrupamento.setdefault(empresa, []).append(numero)
+                else:
+                    nao_lidos.append(nome_arquivo)
+                classificados.append((nome_arquivo, empresa, numero, origem))
+
+            agora = time.perf_counter()
+            if progresso and agora - ultimo_aviso >= intervalo:
+                progresso(min(pos + lote, total) / total)
+                ultimo_aviso = agora
+
+        segundos = time.perf_counter() - inicio
+        if progresso and total:
+            progresso(1.0)
+        return {
+            "agrupamento": agrupamento,
+            "nao_lidos": nao_lidos,
+            "classificados": classificados,
+            "total_processados": total - len(nao_lidos),
+            "segundos": segundos,
+            "arquivos_por_segundo": total / segundos if segundos > 0 else float("inf"),
+        }
+
+
+# ---------------------------------------------------------
+# EXPORTAÇÃO: UM ZIP COM UMA PASTA POR EMPRESA
+# ---------------------------------------------------------
+# O ZIP é escrito em streaming (entrada por entrada, direto no arquivo de
+# destino) e os PDFs vão sem recompressão (ZIP_STORED): já são comprimidos,
+# então empacotar um mês inteiro é basicamente cópia de bytes.
+
+PASTA_NAO_RECONHECIDOS = "_NAO_RECONHECIDOS"
+NOME_MANIFESTO = "manifesto.csv"
+TAMANHO_BLOCO_COPIA = 1024 * 1024
+
+_CARACTERES_INVALIDOS = re.compile(r'[\\/:*?"<>|]+')
+
+
+def _folder_name(empresa):
+    nome = _CARACTERES_INVALIDOS.sub("_", empresa).strip(" .")
+    return nome or PASTA_NAO_RECONHECIDOS
+
+
+def open_upload(arquivo):
+    """Abre um PDF enviado pelo file_uploader sem fechá-lo ao final da cópia."""
+    arquivo.seek(0)
+    return contextlib.nullcontext(arquivo)
+
+
+def open_path(caminho):
+    return open(caminho, "rb")
+
+
+class ZipEntryOpener:
+    """Abre entradas do ZIP de origem; o ZIP é aberto no primeiro uso e fica aberto até close()."""
+
+    def __init__(self, arquivo_zip):
+        self.arquivo_zip = arquivo_zip
+        self._zf = None
+
+    def __call__(self, entrada):
+        if self._zf is None:
+            self._zf = zipfile.ZipFile(self.arquivo_zip)
+        return self._zf.open(entrada)
+
+    def close(self):
+        if self._zf is not None:
+            self._zf.close()
+            self._zf = None
+
+
+def write_company_zip(destino, itens, abrir):
+    """
+    Escreve em `destino` (caminho ou arquivo binário) um ZIP com uma pasta
+    por empresa, mais a pasta de não reconhecidos e o manifesto CSV.
+
+    itens: sequência de (nome do arquivo, empresa ou None, número ou None, origem)
+    abrir: função que recebe a origem e devolve um arquivo binário legível
+    """
+    manifesto = io.StringIO()
+    writer = csv.writer(manifesto, delimiter=";")
+    writer.writerow(["Pasta", "Arquivo", "Empresa", "Número", "Nome Original"])
+    usados = set()
+    agora = time.localtime()[:6]
+
+    with zipfile.ZipFile(destino, "w", allowZip64=True) as zout:
+        for nome, empresa, numero, origem in itens:
+            pasta = _folder_name(empresa) if empresa else PASTA_NAO_RECONHECIDOS
+            base, ext = posixpath.splitext(nome)
+            arquivo, n = nome, 1
+            while f"{pasta}/{arquivo}" in usados:
+                n += 1
+                arquivo = f"{base} ({n}){ext}"
+            caminho = f"{pasta}/{arquivo}"
+            usados.add(caminho)
+
+            info = zipfile.ZipInfo(caminho, date_time=agora)
+            info.compress_type = zipfile.ZIP_STORED
+            with abrir(origem) as src, zout.open(info, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, TAMANHO_BLOCO_COPIA)
+
+            writer.writerow([pasta, arquivo, empresa or "", numero or "", nome])
+
+        zout.writestr(
+            zipfile.ZipInfo(NOME_MANIFESTO, date_time=agora),
+            manifesto.getvalue().encode("utf-8-sig"),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+
+
+def export_company_zip(itens, abrir):
+    """
+    Monta o ZIP em um arquivo temporário em disco (apagado ao final) e
+    devolve o conteúdo em bytes, como o download_button espera. A origem
+    (`abrir`) é fechada ao terminar, se tiver close().
+    """
+    try:
+        with tempfile.TemporaryFile(suffix=".zip") as destino:
+            write_company_zip(destino, itens, abrir)
+            destino.seek(0)
+            return destino.read()
+    finally:
+        if hasattr(abrir, "close"):
+            abrir.close()
@@ -0,0 +1,137 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# ---------------------------------------------------------
+# CACHE DE ARQUIVOS JÁ INTERPRETADOS
+# ---------------------------------------------------------
+# Cada rerun do Streamlit relia o upload do zero (read_csv, read_excel,
+# load_workbook). Este cache guarda o resultado já interpretado, indexado
+# pelo hash do conteúdo + nome do leitor + opções, com limite de memória
+# e descarte LRU. Uma única instância é compartilhada entre as sessões.
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(data):
+    """Hash do conteúdo do arquivo (bytes), usado como parte da chave."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def estimate_size(obj):
+    """Estimativa do tamanho em memória de um resultado interpretado."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        size = obj.memory_usage(deep=True)
+        return int(size.sum()) if isinstance(size, pd.Series) else int(size)
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+_TIPOS_FIXOS = (pd.DataFrame, pd.Series, bytes, bytearray, str, dict, list, tuple, set, frozenset)
+
+
+def _may_grow(obj):
+    """
+    Objetos com estado próprio (ex.: a sessão de riscos, que extrai abas sob
+    demanda) podem crescer depois de guardados; são medidos de novo a cada uso.
+    """
+    return not isinstance(obj, _TIPOS_FIXOS)
+
+
+def _freeze(options):
+    if not options:
+        return ()
+    return tuple(sorted((k, repr(v)) for k, v in options.items()))
+
+
+class ParseCache:
+    """Cache LRU limitado por memória, seguro para uso entre sessões (threads)."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # chave -> (valor, tamanho)
+        self._inflight = {}            # chave -> Lock (evita parse duplicado)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_parse(self, data, parser_name, parser, options=None):
+        """
+        Retorna o resultado de parser(data, **options), reaproveitando o cache.
+        O valor retornado é compartilhado: quem chama não deve alterá-lo.
+        """
+        options = options or {}
+        key = (content_hash(data), parser_name, _freeze(options))
+
+        with self._lock:
+            if key in self._entries:
+                return self._hit(key)
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        # Várias sessões abrindo o mesmo arquivo: só uma interpreta, as outras esperam.
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._hit(key)
+                self.misses += 1
+            try:
+                value = parser(data, **options)
+                self._store(key, value)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return value
+
+    def _hit(self, key):
+        """Entrada encontrada (chamado com o lock): marca o uso e atualiza o tamanho se o valor cresceu."""
+        value, size = self._entries[key]
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if _may_grow(value):
+            novo = estimate_size(value)
+            if novo != size:
+                self._entries[key] = (value, novo)
+                self._bytes += novo - size
+                self._evict()
+        return value
+
+    def _store(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return  # maior que o orçamento inteiro: não guarda
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,225 @@
+import argparse
+import io
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+import coletas
+import desempenho
+import medicamentos
+import notas
+import riscos
+from tabelas import HAS_PYARROW, to_columnar
+
+# ---------------------------------------------------------
+# MOTOR DE RELATÓRIOS SEM INTERFACE (linha de comando)
+# ---------------------------------------------------------
+# As mesmas funções usadas pelas páginas do Streamlit, agora chamáveis sem
+# navegador: cada arquivo de entrada vira um conjunto de tabelas (CSV ou
+# Parquet). Em lote, cada arquivo é processado num processo separado, então
+# o tempo total acompanha o número de núcleos do servidor.
+#
+#   python relatorios.py ENTRADA SAIDA [--analise auto] [--formato csv] [--processos N]
+
+EXTENSOES_ENTRADA = (".csv", ".xlsx", ".xlsm", ".zip")
+FORMATOS_SAIDA = ("csv", "parquet")
+NOME_RESUMO_EXECUCAO = "execucao.csv"
+
+
+def coletas_report(data, hoje=None):
+    preparado = coletas.prepare_coletas(data)
+    if preparado["resumo"] is None:
+        raise ValueError("O arquivo não possui as colunas 'Usuário Nome' ou 'O.S.'.")
+    tabelas = {"resumo": coletas.summary_table(preparado["resumo"])}
+    if preparado["atendimentos"] is not None:
+        tabelas["produtividade_dia"] = coletas.productivity_series(preparado, "Dia")
+        tabelas["produtividade_turno"] = coletas.shift_profile(preparado).reset_index()
+    return tabelas
+
+
+def riscos_report(data, hoje=None, is_csv=False):
+    matriz = riscos.build_risk_matrix_csv(data) if is_csv else riscos.build_risk_matrix_xlsx(data)
+    return {"riscos_altos": matriz.drop(columns=['Linha'])}
+
+
+def medicamentos_report(data, hoje=None):
+    extrato = medicamentos.read_controle(data)
+    hoje = hoje or datetime.now().date()
+    return {"atrasados": medicamentos.overdue(extrato['linhas'], hoje)}
+
+
+def desempenho_report(data, hoje=None, is_csv=False):
+    cubo = desempenho.prepare_survey(data, is_csv)
+    return {
+        "ranking": desempenho.ranking(cubo),
+        "medias": cubo["medias"].rename('Média').reset_index(),
+    }
+
+
+def notas_report(data, hoje=None):
+    itens = notas.list_zip_entries(io.BytesIO(data))
+    resultado = notas.NoteClassifier(notas.load_patterns()).run(itens)
+    tabela = pd.DataFrame(
+        [(nome, empresa, numero) for nome, empresa, numero, _ in resultado["classificados"]],
+        columns=['Arquivo', 'Empresa', 'Número'],
+    )
+    return {"notas": tabela}
+
+
+ANALISES = {
+    "coletas": coletas_report,
+    "riscos": riscos_report,
+    "medicamentos": medicamentos_report,
+    "desempenho": desempenho_report,
+    "notas": notas_report,
+}
+
+
+def detect_analysis(nome, data):
+    """Descobre a análise pelo tipo e pelo conteúdo do arquivo."""
+    extensao = os.path.splitext(nome)[1].lower()
+    if extensao == ".zip":
+        return "notas"
+    if extensao == ".csv":
+        cabecalho = pd.read_csv(
+            io.BytesIO(data), sep=";", encoding=coletas.detect_encoding(data), nrows=0
+        ).columns
+        if coletas.COLUNA_COLABORADOR in cabecalho and coletas.COLUNA_OS in cabecalho:
+            return "coletas"
+        cabecalho = pd.read_csv(io.BytesIO(data), nrows=0, encoding_errors="replace").columns
+        if any(desempenho.TEXTO_CONTATO in str(c) for c in cabecalho):
+            return "desempenho"
+        return "riscos"
+    if medicamentos.ABA_CONTROLE in medicamentos.sheet_names(data):
+        return "medicamentos"
+    cabecalho = pd.read_excel(io.BytesIO(data), nrows=0).columns
+    if any(desempenho.TEXTO_CONTATO in str(c) for c in cabecalho):
+        return "desempenho"
+    return "riscos"
+
+
+def run_analysis(analise, nome, data, hoje=None):
+    """Executa uma análise sobre o conteúdo de um arquivo: {nome da tabela: DataFrame}."""
+    funcao = ANALISES[analise]
+    if analise in ("riscos", "desempenho"):
+        return funcao(data, hoje, is_csv=nome.lower().endswith(".csv"))
+    return funcao(data, hoje)
+
+
+def write_table(df, caminho_base, formato):
+    caminho = f"{caminho_base}.{formato}"
+    if formato == "parquet":
+        to_columnar(df).to_parquet(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False, sep=";", encoding="utf-8-sig")
+    return caminho
+
+
+def process_file(caminho, destino, analise="auto", formato="csv", hoje=None):
+    """
+    Processa um arquivo de entrada e grava suas tabelas em `destino`.
+    Nunca lança exceção: erros voltam no registro, para o lote continuar.
+    """
+    nome = os.path.basename(caminho)
+    registro = {"arquivo": nome, "analise": analise, "status": "ok", "saidas": [], "erro": ""}
+    inicio = time.perf_counter()
+    try:
+        with open(caminho, "rb") as f:
+            data = f.read()
+        if analise == "auto":
+            registro["analise"] = detect_analysis(nome, data)
+        tabelas = run_analysis(registro["analise"], nome, data, hoje)
+        base = os.path.join(destino, os.path.splitext(nome)[0])
+        registro["saidas"] = [
+            write_table(df, f"{base}_{tabela}", formato) for tabela, df in tabelas.items()
+        ]
+    except Exception as e:
+        registro["status"] = "erro"
+        registro["erro"] = f"{type(e).__name__}: {e}"
+        registro["detalhe"] = traceback.format_exc()
+    registro["segundos"] = time.perf_counter() - inicio
+    return registro
+
+
+def list_inputs(entrada):
+    """Arquivo único ou todos os arquivos suportados de uma pasta (sem subpastas)."""
+    if os.path.isfile(entrada):
+        return [entrada]
+    if not os.path.isdir(entrada):
+        raise FileNotFoundError(f"Entrada não encontrada: {entrada}")
+    return [
+        os.path.join(entrada, nome)
+        for nome in sorted(os.listdir(entrada))
+        if nome.lower().endswith(EXTENSOES_ENTRADA) and not nome.startswith(("~$", "."))
+    ]
+
+
+def run_batch(entrada, destino, analise="auto", formato="csv", processos=None, hoje=None, aviso=None):
+    """
+    Processa os arquivos em paralelo (um processo por arquivo, até `processos`
+    ao mesmo tempo) e grava o resumo da execução. `aviso(registro)` é chamado
+    à medida que cada arquivo termina. Retorna a lista de registros.
+    """
+    if formato == "parquet" and not HAS_PYARROW:
+        raise RuntimeError("Saída em Parquet requer o pacote 'pyarrow'.")
+    arquivos = list_inputs(entrada)
+    os.makedirs(destino, exist_ok=True)
+
+    registros = []
+    processos = max(1, min(processos or os.cpu_count() or 1, len(arquivos) or 1))
+    if processos == 1:
+        for caminho in arquivos:
+            registros.append(process_file(caminho, destino, analise, formato, hoje))
+            if aviso:
+                aviso(registros[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            futuros = [pool.submit(process_file, c, destino, analise, formato, hoje) for c in arquivos]
+            for futuro in as_completed(futuros):
+                registros.append(futuro.result())
+                if aviso:
+                    aviso(registros[-1])
+
+    registros.sort(key=lambda r: r["arquivo"])
+    pd.DataFrame(
+        [{**r, "saidas": len(r["saidas"]), "segundos": round(r["segundos"], 3)} for r in registros],
+        columns=["arquivo", "analise", "status", "saidas", "segundos", "erro"],
+    ).to_csv(os.path.join(destino, NOME_RESUMO_EXECUCAO), index=False, sep=";", encoding="utf-8-sig")
+    return registros
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Gera os relatórios do dashboard (coletas, riscos, medicamentos, notas, desempenho) sem interface."
+    )
+    parser.add_argument("entrada", help="arquivo ou pasta com os arquivos de entrada")
+    parser.add_argument("saida", help="pasta onde as tabelas serão gravadas")
+    parser.add_argument("--analise", choices=["auto", *ANALISES], default="auto",
+                        help="análise a aplicar (padrão: detectar pelo arquivo)")
+    parser.add_argument("--formato", choices=FORMATOS_SAIDA, default="csv")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="processos em paralelo (padrão: número de núcleos)")
+    parser.add_argument("--data", default=None,
+                        help="data de referência dos atrasos, AAAA-MM-DD (padrão: hoje)")
+    args = parser.parse_args(argv)
+
+    hoje = datetime.strptime(args.data, "%Y-%m-%d").date() if args.data else None
+
+    def aviso(registro):
+        situacao = "ok" if registro["status"] == "ok" else f"ERRO ({registro['erro']})"
+        print(f"[{registro['analise']}] {registro['arquivo']}: {situacao} em {registro['segundos']:.2f}s", flush=True)
+
+    inicio = time.perf_counter()
+    registros = run_batch(args.entrada, args.saida, args.analise, args.formato, args.processos, hoje, aviso)
+    falhas = sum(r["status"] != "ok" for r in registros)
+    print(f"{len(registros)} arquivos em {time.perf_counter() - inicio:.2f}s, {falhas} com erro.")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
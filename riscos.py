@@ -0,0 +1,157 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------
+# MAPEAMENTO DE RISCOS: MATRIZ DE TODOS OS SETORES x MESES
+# ---------------------------------------------------------
+# Layout da planilha: coluna A = identificação do risco, B = causa e, a partir
+# da coluna I (índice 8), um par de colunas por mês: conteúdo e classificação.
+
+MESES = ['JAN', 'FEV', 'MAR', 'ABR', 'MAI', 'JUN', 'JUL', 'AGO', 'SET', 'OUT', 'NOV', 'DEZ']
+RISCOS_ALTOS = ['2A', '3A', '4A', '5A', '3B', '4B', '5B', '5C']
+LINHAS_IGNORADAS = [
+    'FONTE', 'IDENTIFICAÇÃO DO RISCO', 'Identificação do Risco',
+    'Riscos Institucionais Gerenciados',
+    'Riscos Institucionais  não Gerenciados/Inventariados',
+    'C.H.O.R.C.'
+]
+PRIMEIRA_COLUNA_MES = 8
+NOME_ABA_CSV = "Arquivo CSV"
+
+COLUNAS_MATRIZ = ['Setor', 'Mês', 'Linha', 'Identificação do Risco', 'Causa', 'Conteúdo', 'Classificação']
+
+
+def extract_high_risks(df, setor):
+    """
+    Extrai, de uma aba inteira e para todos os meses de uma vez, os riscos
+    classificados como Alto/Muito Alto. Retorna uma tabela longa (um registro
+    por risco x mês), na mesma ordem de linhas da planilha.
+    """
+    n_meses = max(0, min(len(MESES), (df.shape[1] - PRIMEIRA_COLUNA_MES) // 2))
+    if n_meses == 0 or df.empty:
+        return pd.DataFrame(columns=COLUNAS_MATRIZ)
+
+    primeira = df.iloc[:, 0]
+    validas = primeira.notna() & ~primeira.astype(str).str.strip().isin(LINHAS_IGNORADAS)
+    linhas = np.flatnonzero(validas.to_numpy())
+
+    fim = PRIMEIRA_COLUNA_MES + 2 * n_meses
+    conteudos = df.iloc[linhas, PRIMEIRA_COLUNA_MES:fim:2].to_numpy()
+    classes = df.iloc[linhas, PRIMEIRA_COLUNA_MES + 1:fim:2].to_numpy()
+
+    # Achata (linha, mês) em um único vetor e filtra os códigos de uma vez
+    classificacao = pd.Series(classes.ravel()).astype(str).str.strip().str.upper()
+    alvo = np.flatnonzero(classificacao.isin(RISCOS_ALTOS).to_numpy())
+    pos_linha, pos_mes = np.divmod(alvo, n_meses)
+    origem = linhas[pos_linha]
+
+    return pd.DataFrame({
+        'Setor': setor,
+        'Mês': np.asarray(MESES)[pos_mes],
+        'Linha': origem,
+        'Identificação do Risco': df.iloc[origem, 0].to_numpy(),
+        'Causa': df.iloc[origem, 1].to_numpy() if df.shape[1] > 1 else None,
+        'Conteúdo': conteudos.ravel()[alvo],
+        'Classificação': classificacao.to_numpy()[alvo],
+    }, columns=COLUNAS_MATRIZ)
+
+
+def build_risk_matrix_xlsx(data):
+    """Lê todas as abas de setor em uma única abertura do arquivo e monta a matriz."""
+    abas = pd.read_excel(io.BytesIO(data), sheet_name=None, header=None)
+    partes = [extract_high_risks(df, nome) for nome, df in abas.items() if "Legenda" not in nome]
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_MATRIZ)
+    return pd.concat(partes, ignore_index=True)
+
+
+def build_risk_matrix_csv(data):
+    df = pd.read_csv(io.BytesIO(data), header=None, sep=';', encoding='latin1')
+    return extract_high_risks(df, NOME_ABA_CSV)
+
+
+def lookup(matriz, setor=None, mes=None):
+    """Consulta a matriz já montada; None em setor/mês significa 'todos'."""
+    filtro = np.ones(len(matriz), dtype=bool)
+    if setor is not None:
+        filtro &= (matriz['Setor'] == setor).to_numpy()
+    if mes is not None:
+        filtro &= (matriz['Mês'] == mes).to_numpy()
+    return matriz[filtro]
+
+
+# ---------------------------------------------------------
+# SESSÃO DA PLANILHA DE RISCOS
+# ---------------------------------------------------------
+
+class RiskWorkbookSession:
+    """
+    Abre a planilha de riscos uma única vez e interpreta as abas sob demanda.
+    Abas já lidas ficam em pickle num diretório temporário (tipos das colunas
+    mistas preservados, igual à leitura direta) e as demais podem ser
+    pré-carregadas em segundo plano.
+    """
+
+    def __init__(self, data):
+        self._tamanho = len(data)
+        self._xl = pd.ExcelFile(io.BytesIO(data))
+        self.sheet_names = [s for s in self._xl.sheet_names if "Legenda" not in s]
+        self._lock = threading.Lock()
+        self._spill = {}      # aba -> caminho do pickle
+        self._riscos = {}     # aba -> tabela longa de riscos altos
+        self._prefetch = None
+        self._dir = tempfile.mkdtemp(prefix="riscos_")
+        weakref.finalize(self, shutil.rmtree, self._dir, True)
+
+    def __sizeof__(self):
+        # O cache mede a sessão pelo arquivo aberto + riscos extraídos até agora
+        # (medida de novo a cada uso, já que as abas são extraídas sob demanda)
+        return self._tamanho + sum(sys.getsizeof(df) for df in list(self._riscos.values()))
+
+    def _parse(self, nome):
+        with self._lock:
+            if nome in self._spill:
+                return None
+            df = self._xl.parse(nome, header=None)
+            caminho = os.path.join(self._dir, f"{self.sheet_names.index(nome)}.pkl")
+            df.to_pickle(caminho)
+            self._spill[nome] = caminho
+            return df
+
+    def sheet(self, nome):
+        """DataFrame da aba (header=None), lido do xlsx só no primeiro acesso."""
+        df = self._parse(nome)
+        if df is not None:
+            return df
+        return pd.read_pickle(self._spill[nome])
+
+    def high_risks(self, nome):
+        """Tabela longa de riscos altos da aba (todos os meses), memorizada."""
+        if nome not in self._riscos:
+            self._riscos[nome] = extract_high_risks(self.sheet(nome), nome)
+        return self._riscos[nome]
+
+    def matrix(self, setores=None):
+        setores = self.sheet_names if setores is None else setores
+        partes = [self.high_risks(nome) for nome in setores]
+        if not partes:
+            return pd.DataFrame(columns=COLUNAS_MATRIZ)
+        return pd.concat(partes, ignore_index=True)
+
+    def prefetch(self):
+        """Pré-carrega em segundo plano as abas ainda não lidas."""
+        if self._prefetch is not None:
+            return
+        def _run():
+            for nome in self.sheet_names:
+                self._parse(nome)
+        self._prefetch = threading.Thread(target=_run, name="riscos-prefetch", daemon=True)
+        self._prefetch.start()
@@ -0,0 +1,20 @@
+import importlib.util
+
+# ---------------------------------------------------------
+# TABELAS EM FORMATO COLUNAR (Arrow / Parquet)
+# ---------------------------------------------------------
+# Colunas object com valores mistos (número e texto na mesma coluna) não
+# cabem num tipo Arrow; aqui elas viram string antes da conversão.
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def to_columnar(df):
+    """Cópia do DataFrame com nomes de coluna em texto e colunas mistas como string."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            serie = df[col]
+            df[col] = serie.where(serie.isna(), serie.astype(str)).astype("string")
+    df.columns = [str(c) for c in df.columns]
+    return df